@@ -0,0 +1,37 @@
+import importlib
+import misc
+
+# Picks the agent a simulation runs. Agents are given as "module:Class" specs,
+# e.g. "ai:AI", or by one of the short names below. Whatever class the spec
+# names is constructed with a single seed argument and then has update(percepts)
+# called once per turn, just like ai.AI.
+
+DEFAULT_AGENT = "ai:AI"
+
+# short names for the agents that ship with the project
+AGENTS = {
+    "bfs": "ai:AI"
+}
+
+def load_agent(spec=None):
+    if spec is None:
+        spec = DEFAULT_AGENT
+    spec = AGENTS.get(spec, spec)
+
+    module_name, _, class_name = spec.partition(":")
+    try:
+        module = importlib.import_module(module_name)
+    # anything the module raises while importing (a SyntaxError too) means it can't be used
+    except Exception as e:
+        raise misc.InvalidAgentException(f"Agent module {module_name} could not be imported: {e}")
+
+    agent_class = getattr(module, class_name or "AI", None)
+    if agent_class is None:
+        raise misc.InvalidAgentException(f"Agent module {module_name} has no class {class_name or 'AI'}.")
+    return agent_class
+
+def exceeds_budget(turn_time, episode_time, turn_budget=None, episode_budget=None):
+    # whether an agent has used up its time, per turn or in total (in seconds)
+    if turn_budget is not None and turn_time > turn_budget:
+        return True
+    return episode_budget is not None and episode_time > episode_budget
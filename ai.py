@@ -47,7 +47,11 @@
 # easier to render in terminal for debugging, for a small performance hit)
 
 import random
-from aiDependancies.tile import Tile
+from collections import deque
+from aiDependancies.tile import unknownBits
+from aiDependancies.memory import Memory
+from aiDependancies.planner import Planner
+from aiDependancies.region import Region
 
 # define how cardinal directions are oriented in the agent's map
 directionCoordinates = {
@@ -65,25 +69,65 @@ directionOpposites = {
     'W': 'E'
 }
 
+# and the other way around, for turning a step between tiles back into a direction
+coordinateDirections = {offset: direction for direction, offset in directionCoordinates.items()}
+
+# where each kind of stair takes the agent when it is used
+stairPartners = {'b': 'o', 'o': 'b', 'y': 'p', 'p': 'y'}
+
+# goal tiles, each worth 100 points the first time one of its kind is used
+goalTypes = set('0123456789')
+
+# the most steps worth walking to a goal, since the walk usually has to be made back again
+goalWorth = 50
+
 class AI:
-    def __init__(self):
+    def __init__(self, seed=None):
         """
         Called once before the sim starts. You may use this function
         to initialize any data or data structures you need.
+
+        seed seeds this agent's own random number generator, so a run
+        can be reproduced exactly. None seeds it from the system.
         """
 
         # for debugging
         self.print = False
 
+        # independent from the global random module, so simulations don't share a stream
+        self.random = random.Random(seed)
+
         self.turn = 0
         self.location = [0, 0]     # relative location of the agent, (x, y)
-        self.memory = [[Tile()]]   # memory stored sideways relative to the world, (y, x)
-        self.memoryOrigin = [0, 0] # coordinate of "top-left" tile in memory, (x, y)
-        self.memorySize = [1, 1]   # bounds of memory, (x, y)
+        self.memory = Memory()     # known tiles, indexed by relative location
+        self.memory.store(0, 0, 'g')
+
+        # coordinates of known, walkable tiles that still have unknown neighbors
+        self.frontier = {(0, 0)}
 
         # remember the current "plan" to avoid recalculating paths
         self.nextActions = []
 
+        # tiles taken off the queue by findClosestUnknown, over the whole run
+        self.nodesExpanded = 0
+
+        # where the exit and any unused goals are, once they have been seen
+        self.exit = None
+        self.goals = {}            # goal type of each known goal tile, by relative location
+
+        # plans paths to those, and whether a new one has been seen since the last choice
+        self.planner = Planner(self.memory)
+        self.retarget = False
+
+        # where each kind of stair is, and where those with both ends known lead
+        self.landmarks = {}
+        self.links = {}
+
+        # other parts of the world the agent has been to, but can't place relative to
+        # this one yet (see Region), and the stairs it used last turn, if any
+        self.regions = []
+        self.usedStairs = None
+
     def update(self, percepts):
         """
         PERCEPTS:
@@ -111,6 +155,20 @@ class AI:
 
         # if the agent ever reaches the finish, use it no matter what
         if percepts['X'][0] == 'r': return 'U'
+
+        # find out where any stairs used last turn went
+        here = percepts['X'][0]
+        if self.usedStairs is not None:
+            self.arrive(here)
+
+        # keep the agent's own tile up to date too
+        if self.memory.typeAt(self.location[0], self.location[1]) != here:
+            self.rememberTile(self.location[0], self.location[1], here)
+
+        # and use any goal it is standing on
+        if here in goalTypes:
+            self.useGoal(here)
+            return 'U'
         
         # for each percept
         for direction, tiles in percepts.items():
@@ -118,125 +176,286 @@ class AI:
             # (except X)
             if direction == 'X': continue
 
-            # add the tile to memory
+            # add the tile to memory, unless it is already known
             for i in range(len(tiles)):
                 tileLocation = (
                     self.location[0] + (i+1)*directionCoordinates[direction][0],
                     self.location[1] + (i+1)*directionCoordinates[direction][1]
                 )
-                self.rememberTile(Tile(tileLocation[0], tileLocation[1], tiles[i]))
-            
-            # and plan a path to the finish if it is spotted
-            if 'r' in tiles:
-                self.nextActions = [direction for tile in tiles]
-                self.nextActions[-1] = 'U'
+                if self.memory.typeAt(tileLocation[0], tileLocation[1]) == tiles[i]: continue
+                self.rememberTile(tileLocation[0], tileLocation[1], tiles[i])
 
         # print the current state of memory, if enabled
         self.printMap()
         if self.print: print(self.location)
 
-        # if there is no plan, make one
-        if not self.nextActions:
-            # by finding the closest unknown tile
-            self.nextActions = self.findClosestUnknown()
+        # work around any walls found on the way to the exit or a goal
+        if self.planner.broken:
+            self.planner.repair(tuple(self.location))
 
-        # perform the first action in the plan
-        choice = self.nextActions.pop(0)
-        self.move(directionCoordinates[choice])
-        return choice
+        # head for the exit or a goal when one turns up, or whenever exploring runs out of plan
+        if self.retarget or (not self.planner.path and not self.nextActions and (self.exit or self.goals)):
+            self.retarget = False
+            self.chooseTarget()
 
-    # function to handle expanding memory to accomidate new information, if necessary
-    def rememberTile(self, t: Tile = Tile()):
-        # if the tile is "left" of memory
-        while (t.relativePosition[0] < self.memoryOrigin[0]):
-            for i in range(self.memorySize[1]): self.memory[i].insert(0, None)
-            self.memorySize[0] += 1
-            self.memoryOrigin[0] -= 1
-        
-        # if the tile is "right" of memory
-        while (t.relativePosition[0] >= self.memoryOrigin[0] + self.memorySize[0]):
-            for i in range(self.memorySize[1]): self.memory[i].append(None)
-            self.memorySize[0] += 1
-
-        # if the tile is "above" memory
-        while (t.relativePosition[1] < self.memoryOrigin[1]):
-            self.memory.insert(0, [None for i in range(self.memorySize[0])])
-            self.memorySize[1] += 1
-            self.memoryOrigin[1] -= 1
-        
-        # if the tile is "below" memory
-        while (t.relativePosition[1] >= self.memoryOrigin[1] + self.memorySize[1]):
-            self.memory.append([None for i in range(self.memorySize[0])])
-            self.memorySize[1] += 1
+        if self.planner.path:
+            # take the next step towards it (anything but a neighbor is the other end of some stairs)
+            x, y = self.planner.nextTile()
+            choice = coordinateDirections.get((x - self.location[0], y - self.location[1]), 'U')
+        else:
+            # if there is no plan, make one
+            if not self.nextActions:
+                # by finding the closest unknown tile
+                self.nextActions = self.findClosestUnknown()
+
+            # perform the first action in the plan
+            choice = self.nextActions.pop(0)
+
+        # stairs take effect where the agent is, anything else moves it
+        if choice == 'U':
+            if here in stairPartners: self.usedStairs = here
+        else:
+            self.move(directionCoordinates[choice])
+        return choice
 
-        # once expanded, store the tile data
-        self.memory[t.relativePosition[1] - self.memoryOrigin[1]][t.relativePosition[0] - self.memoryOrigin[0]] = t
+    # function to store new information in memory (which expands itself, if necessary)
+    def rememberTile(self, x, y, cellType='g'):
+        unknownMask = 0
 
         # register which directions of the tile are known and which are not
         for direction, offset in directionCoordinates.items():
-            neighbor = self.tileAt(t.relativePosition[0] + offset[0], t.relativePosition[1] + offset[1])
-            if neighbor:
-                if directionOpposites[direction] in neighbor.unknowns: neighbor.unknowns.remove(directionOpposites[direction])
-                if direction in t.unknowns: t.unknowns.remove(direction)
+            neighbor = (x + offset[0], y + offset[1])
+            if self.memory.typeAt(neighbor[0], neighbor[1]):
+                # a neighbor with nothing left to discover drops off the frontier
+                if not self.memory.clearUnknown(neighbor[0], neighbor[1], unknownBits[directionOpposites[direction]]):
+                    self.frontier.discard(neighbor)
+            else:
+                unknownMask |= unknownBits[direction]
+
+        self.memory.store(x, y, cellType, unknownMask)
+
+        # keep the frontier up to date with this tile too
+        if unknownMask and cellType != 'w':
+            self.frontier.add((x, y))
+        else:
+            self.frontier.discard((x, y))
+
+        # and note anything worth planning a path to, or that gets in the way of one
+        if cellType == 'r':
+            self.exit = (x, y)
+            self.retarget = True
+        elif cellType in goalTypes:
+            self.goals[(x, y)] = cellType
+            self.retarget = True
+        elif cellType == 'w':
+            self.planner.wallFound(x, y)
+        elif cellType in stairPartners:
+            self.landmarks[cellType] = (x, y)
+            self.mergeRegions(cellType)
+            self.linkStairs()
+    
+    # using a goal turns every tile of its type into floor, so forget all of them
+    def useGoal(self, goalType):
+        for position in [position for position, cellType in self.goals.items() if cellType == goalType]:
+            del self.goals[position]
+            self.rememberTile(position[0], position[1], 'g')
+
+        # in every region
+        for region in self.regions:
+            for position in [position for position, cellType in region.goals.items() if cellType == goalType]:
+                del region.goals[position]
+                region.memory.store(position[0], position[1], 'g', region.memory.unknownsAt(position[0], position[1]))
+
+        self.planner.clear()
+        self.retarget = True
+
+    # stairs with both ends in this region are a one-turn step from one end to the other
+    def linkStairs(self):
+        self.links = {
+            position: self.landmarks[stairPartners[stairs]]
+            for stairs, position in self.landmarks.items() if stairPartners[stairs] in self.landmarks
+        }
+        self.planner.links = self.links
+
+    # whether stairs in this region are worth taking: to a region where the exit is known, or,
+    # once this one has nothing left to explore, to anywhere that still has something to find
+    def leadsSomewhere(self, stairs):
+        partner = stairPartners[stairs]
+        if partner in self.landmarks: return False
+        for region in self.regions:
+            if partner in region.landmarks:
+                return region.exit is not None or (not self.frontier and self.somethingToFind(region))
+        return not self.frontier
+
+    # whether a region has unknown tiles left, or stairs to somewhere not placed in any region yet
+    def somethingToFind(self, region):
+        if region.frontier: return True
+        return any(not self.placed(stairPartners[stairs]) for stairs in region.landmarks)
+
+    # whether a kind of stair has been seen in this region or any other
+    def placed(self, stairs):
+        return stairs in self.landmarks or any(stairs in region.landmarks for region in self.regions)
+
+    # work out where the stairs the agent used last turn took it
+    def arrive(self, here):
+        partner = stairPartners[self.usedStairs]
+        self.usedStairs = None
+        if here != partner: return
+
+        # somewhere already known in this region
+        if partner in self.landmarks:
+            self.location = list(self.landmarks[partner])
+            return
+
+        # somewhere in a region it has been to before
+        self.leaveRegion()
+        for region in self.regions:
+            if partner in region.landmarks:
+                self.regions.remove(region)
+                region.location = list(region.landmarks[partner])
+                self.enterRegion(region)
+                return
+
+        # or somewhere new, which starts a region of its own
+        self.enterRegion(Region())
+
+    # put what the agent knows about this region aside
+    def leaveRegion(self):
+        region = Region()
+        region.location = self.location
+        region.memory = self.memory
+        region.frontier = self.frontier
+        region.exit = self.exit
+        region.goals = self.goals
+        region.landmarks = self.landmarks
+        self.regions.append(region)
+
+    # and pick up what it knows about another one
+    def enterRegion(self, region):
+        self.location = region.location
+        self.memory = region.memory
+        self.frontier = region.frontier
+        self.exit = region.exit
+        self.goals = region.goals
+        self.landmarks = region.landmarks
+        self.linkStairs()
+
+        # plans made in the old region's coordinates mean nothing here
+        self.nextActions = []
+        self.planner.memory = self.memory
+        self.planner.clear()
+        self.retarget = True
+
+    # stairs seen here that another region has seen too put both regions in the same
+    # coordinates, so copy everything the other one knows into this one
+    def mergeRegions(self, stairs):
+        for region in self.regions:
+            if stairs in region.landmarks:
+                self.regions.remove(region)
+                offsetX = self.landmarks[stairs][0] - region.landmarks[stairs][0]
+                offsetY = self.landmarks[stairs][1] - region.landmarks[stairs][1]
+                for x, y, cellType in region.memory.knownTiles():
+                    if not self.memory.typeAt(x + offsetX, y + offsetY):
+                        self.rememberTile(x + offsetX, y + offsetY, cellType)
+                self.memory.grows += region.memory.grows
+                return
+
+    # plan a path to the closest goal worth the walk, or else to the exit if it is known
+    def chooseTarget(self):
+        start = tuple(self.location)
+        target = None
+        path = None
+        for position in self.goals:
+            limit = goalWorth if path is None else len(path) - 1
+            if abs(position[0] - start[0]) + abs(position[1] - start[1]) > limit: continue
+            goalPath = self.planner.findPath(start, position, limit)
+            if goalPath is not None:
+                target = position
+                path = goalPath
+
+        if path is not None:
+            self.planner.follow(target, path)
+        elif self.exit is None or not self.planner.plan(start, self.exit):
+            self.planner.clear()
+            return
+
+        # a plan to follow replaces whatever exploring was going to do
+        self.nextActions = []
     
-    # since memory is not indexed with coordinates, just make a function to avoid mistakes
+    # shorthand for looking a tile up in memory (as a Tile, for debugging and printing)
     def tileAt(self, x, y):
-        if not (x in range(self.memoryOrigin[0], self.memoryOrigin[0]+self.memorySize[0]) and y in range(self.memoryOrigin[1], self.memoryOrigin[1]+self.memorySize[1])): return None
-        return self.memory[y-self.memoryOrigin[1]][x-self.memoryOrigin[0]]
+        return self.memory.tileAt(x, y)
     
     
     def move(self, amount):
-        tile = self.tileAt(self.location[0] + amount[0], self.location[1] + amount[1])
+        tileType = self.memory.typeAt(self.location[0] + amount[0], self.location[1] + amount[1])
 
         # if the agent doesn't hit a wall when trying to move, update its position
-        if tile:
-            if tile.type != 'w':
+        if tileType:
+            if tileType != 'w':
                 self.location[0] += amount[0]
                 self.location[1] += amount[1]
     
     # find the closest tile with at least one unknown neighbor, using bft
     def findClosestUnknown(self):
-        # store the coordinates of "seen" tiles
-        tilesChecked = [self.location]
-
-        # store the visitable tiles alongside the path taken to reach them
-        tileFrontier = [([], self.tileAt(self.location[0], self.location[1]))]
-
-        # while there are still unsearched tiles
-        while tileFrontier:
-            # remove a tile
-            currentPath, currentTile = tileFrontier.pop(0)
-
-            # move to it if it has an unknown neighbor
-            if currentTile.unknowns: return currentPath
-
-            # add unseen neighbors to the frontier if not
-            neighbors = []
-
-            # for each direction (in a random order because determinism is less fun)
-            for direction, offset in sorted(directionCoordinates.items(), key=lambda e: random.random()):
-                # add the neighbor in that direction, alongside the updated path to it
-                # this neighbor will always be known, since the function would have already returned otherwise
-                neighbors.append([
-                    currentPath + [direction],
-                    self.tileAt(currentTile.relativePosition[0] + offset[0], currentTile.relativePosition[1] + offset[1])
-                ])
-            
-            # now, select only those neighbors which are not already in the frontier and aren't walls
-            frontierAdditions = list(filter(lambda t: t[1] and t[1].type != 'w' and t[1].relativePosition not in tilesChecked, neighbors))
-
-            # and add those to the list of seen tiles and the list of visitable tiles
-            tileFrontier.extend(frontierAdditions)
-            tilesChecked.extend([addition[1].relativePosition for addition in frontierAdditions])
-        
+        start = tuple(self.location)
+
+        # stairs out of the region count as unknown too, as long as there is something left where they go
+        openStairs = {position for stairs, position in self.landmarks.items() if self.leadsSomewhere(stairs)}
+
+        # only bother searching if there is something left to find
+        if self.frontier or openStairs:
+            # each reached tile points back at the tile it was reached from, and how
+            parents = {start: None}
+            tileQueue = deque([start])
+            directions = list(directionCoordinates.items())
+
+            # while there are still unsearched tiles
+            while tileQueue:
+                position = tileQueue.popleft()
+                self.nodesExpanded += 1
+
+                # move to it if it has an unknown neighbor
+                if position in self.frontier and position != start: return self.pathTo(parents, position)
+
+                # or go through it if it is one of those stairs
+                if position in openStairs: return self.pathTo(parents, position) + ['U']
+
+                # add unseen, walkable neighbors to the queue if not
+                # (in a random order because determinism is less fun)
+                self.random.shuffle(directions)
+                for direction, offset in directions:
+                    neighbor = (position[0] + offset[0], position[1] + offset[1])
+                    if neighbor in parents: continue
+                    tileType = self.memory.typeAt(neighbor[0], neighbor[1])
+                    if tileType and tileType != 'w':
+                        parents[neighbor] = (position, direction)
+                        tileQueue.append(neighbor)
+
+                # stairs with both ends known are one more step
+                if position in self.links and self.links[position] not in parents:
+                    parents[self.links[position]] = (position, 'U')
+                    tileQueue.append(self.links[position])
+
         # if nothing is found, walk randomly (this should never happen if the map is completeable)
-        return random.choice(['N', 'S', 'E', 'W'])
+        return [self.random.choice(['N', 'S', 'E', 'W'])]
+
+    # rebuild the path to a tile reached by findClosestUnknown by walking its parents back to the start
+    def pathTo(self, parents, position):
+        path = []
+        while parents[position] is not None:
+            position, direction = parents[position]
+            path.append(direction)
+        path.reverse()
+        return path
 
     def printMap(self):
         # print the current map knowledge using some unreadaable list manipulation (sorry)
         if self.print: 
-            print("    | " + ' '.join([f"{i+self.memoryOrigin[0]:4}" for i in range(self.memorySize[0])]))
-            print("----+-" + 5*self.memorySize[0]*'-')
-            print('\n'.join([f"{i+self.memoryOrigin[1]:3d} | " +' '.join([f"{str(tile) if tile else "  ? ":>4}" for tile in self.memory[i]]) for i in range(self.memorySize[1])]))
-            print("----+-" + 5*self.memorySize[0]*'-')
+            columns = range(self.memory.lower[0], self.memory.upper[0]+1)
+            rows = range(self.memory.lower[1], self.memory.upper[1]+1)
+            print("    | " + ' '.join([f"{x:4}" for x in columns]))
+            print("----+-" + 5*len(columns)*'-')
+            print('\n'.join([f"{y:3d} | " +' '.join([f"{str(tile) if tile else "  ? ":>4}" for tile in [self.tileAt(x, y) for x in columns]]) for y in rows]))
+            print("----+-" + 5*len(columns)*'-')
             print()
\ No newline at end of file
@@ -0,0 +1,97 @@
+from aiDependancies.tile import Tile, allUnknown
+
+# a grid of tiles indexed by the agent's relative coordinates, which can grow in any
+# direction. the allocated area doubles along an axis whenever a tile falls outside
+# of it, so expanding is amortized O(1) per tile instead of O(rows) per insert.
+# tiles are kept as two parallel byte arrays rather than as objects: the character
+# code of each tile's type (0 where nothing is known), and a 4-bit mask of which of
+# its neighbors are still unknown
+class Memory:
+	def __init__(self):
+		self.origin = [0, 0]          # coordinate of the "top-left" allocated slot, (x, y)
+		self.capacity = [1, 1]        # size of the allocated area, (x, y)
+		self.types = bytearray(1)     # type of each slot, row by row
+		self.unknowns = bytearray(1)  # unknown neighbor mask of each slot, row by row
+
+		# bounds of the tiles actually stored so far, (x, y)
+		self.lower = [0, 0]
+		self.upper = [0, 0]
+
+		# how many times the arrays have been reallocated
+		self.grows = 0
+
+	# position of a coordinate in the arrays, or -1 if it isn't allocated
+	def slot(self, x, y):
+		x -= self.origin[0]
+		y -= self.origin[1]
+		if 0 <= x < self.capacity[0] and 0 <= y < self.capacity[1]:
+			return y*self.capacity[0] + x
+		return -1
+
+	def typeAt(self, x, y):
+		i = self.slot(x, y)
+		if i < 0 or not self.types[i]: return None
+		return chr(self.types[i])
+
+	def unknownsAt(self, x, y):
+		i = self.slot(x, y)
+		if i < 0: return 0
+		return self.unknowns[i]
+
+	# every stored tile, as (x, y, type)
+	def knownTiles(self):
+		for i, code in enumerate(self.types):
+			if code: yield (self.origin[0] + i % self.capacity[0], self.origin[1] + i // self.capacity[0], chr(code))
+
+	# a snapshot of the tile at a coordinate, for anything that wants a whole tile
+	def tileAt(self, x, y):
+		i = self.slot(x, y)
+		if i < 0 or not self.types[i]: return None
+		return Tile(x, y, chr(self.types[i]), self.unknowns[i])
+
+	def store(self, x, y, cellType, unknownMask=allUnknown):
+		i = self.slot(x, y)
+		if i < 0:
+			self.grow(x, y)
+			i = self.slot(x, y)
+		self.types[i] = ord(cellType)
+		self.unknowns[i] = unknownMask
+
+		self.lower[0] = min(self.lower[0], x)
+		self.lower[1] = min(self.lower[1], y)
+		self.upper[0] = max(self.upper[0], x)
+		self.upper[1] = max(self.upper[1], y)
+
+	# mark one direction of a stored tile as known, returning what is left unknown
+	def clearUnknown(self, x, y, bit):
+		i = self.slot(x, y)
+		self.unknowns[i] &= ~bit
+		return self.unknowns[i]
+
+	def grow(self, x, y):
+		# double the allocated area towards (x, y) until it fits
+		origin = list(self.origin)
+		capacity = list(self.capacity)
+		for axis, position in enumerate((x, y)):
+			while position < origin[axis]:
+				origin[axis] -= capacity[axis]
+				capacity[axis] *= 2
+			while position >= origin[axis] + capacity[axis]:
+				capacity[axis] *= 2
+
+		# then copy the old rows into place
+		types = bytearray(capacity[0]*capacity[1])
+		unknowns = bytearray(capacity[0]*capacity[1])
+		offsetX = self.origin[0] - origin[0]
+		offsetY = self.origin[1] - origin[1]
+		for row in range(self.capacity[1]):
+			start = (row + offsetY)*capacity[0] + offsetX
+			old = row*self.capacity[0]
+			types[start:start + self.capacity[0]] = self.types[old:old + self.capacity[0]]
+			unknowns[start:start + self.capacity[0]] = self.unknowns[old:old + self.capacity[0]]
+
+		self.origin = origin
+		self.capacity = capacity
+		self.types = types
+		self.unknowns = unknowns
+		self.grows += 1
@@ -0,0 +1,117 @@
+import heapq
+
+# plans paths over the agent's memory to tiles it already knows about (the exit,
+# goals), using A* with the Manhattan distance as its heuristic. tiles that haven't
+# been seen yet are assumed to be walkable as long as they are inside the known
+# bounds, so a plan can cut through unexplored space instead of waiting for it to
+# be mapped. the agent always sees its neighbors before moving, so it never walks
+# into a wall; when one turns up on the plan, only the broken part is replanned.
+# stairs with both ends known are one more step, from one end to the other.
+class Planner:
+	def __init__(self, memory):
+		self.memory = memory
+		self.links = {}          # where the stairs on each tile lead, if known
+		self.target = None       # tile the current plan leads to, (x, y)
+		self.path = []           # tiles left to walk to the target, in order
+		self.pathTiles = set()   # the same tiles, for checking new walls against
+		self.broken = False      # whether a wall has been found on the path since it was planned
+
+		# tiles taken off the open list by findPath, over the whole run
+		self.nodesExpanded = 0
+
+	# whether a plan may go through a tile (unknown tiles are optimistically open)
+	def passable(self, x, y):
+		tileType = self.memory.typeAt(x, y)
+		if tileType: return tileType != 'w'
+		return self.memory.lower[0] <= x <= self.memory.upper[0] and self.memory.lower[1] <= y <= self.memory.upper[1]
+
+	# shortest path from start to goal, not counting start, or None if there is none
+	# no longer than limit
+	def findPath(self, start, goal, limit=None):
+		if not self.passable(goal[0], goal[1]): return None
+
+		# the Manhattan distance, or the distance through a set of stairs if that is shorter
+		def distance(position):
+			direct = abs(position[0] - goal[0]) + abs(position[1] - goal[1])
+			for stairs, partner in self.links.items():
+				direct = min(direct, abs(position[0] - stairs[0]) + abs(position[1] - stairs[1]) + 1
+					+ abs(partner[0] - goal[0]) + abs(partner[1] - goal[1]))
+			return direct
+
+		# entries are (estimated total, -steps so far, tile): ties go to the tile furthest along
+		parents = {start: None}
+		steps = {start: 0}
+		openList = [(distance(start), 0, start)]
+		while openList:
+			estimate, negativeSteps, position = heapq.heappop(openList)
+			if -negativeSteps != steps[position]: continue
+			self.nodesExpanded += 1
+
+			if position == goal:
+				path = []
+				while position != start:
+					path.append(position)
+					position = parents[position]
+				path.reverse()
+				return path
+
+			nextSteps = steps[position] + 1
+			neighbors = [
+				(position[0], position[1] - 1),
+				(position[0], position[1] + 1),
+				(position[0] + 1, position[1]),
+				(position[0] - 1, position[1])
+			]
+			if position in self.links: neighbors.append(self.links[position])
+			for neighbor in neighbors:
+				if neighbor in steps and steps[neighbor] <= nextSteps: continue
+				if not self.passable(neighbor[0], neighbor[1]): continue
+				estimate = nextSteps + distance(neighbor)
+				if limit is not None and estimate > limit: continue
+				steps[neighbor] = nextSteps
+				parents[neighbor] = position
+				heapq.heappush(openList, (estimate, -nextSteps, neighbor))
+
+		return None
+
+	# plan a path to target, returning whether there is one
+	def plan(self, start, target, limit=None):
+		return self.follow(target, self.findPath(start, target, limit))
+
+	# take a path found by findPath as the plan
+	def follow(self, target, path):
+		if path is None:
+			self.clear()
+			return False
+		self.target = target
+		self.path = path
+		self.pathTiles = set(path)
+		self.broken = False
+		return True
+
+	def clear(self):
+		self.target = None
+		self.path = []
+		self.pathTiles = set()
+		self.broken = False
+
+	# called with every wall the agent finds
+	def wallFound(self, x, y):
+		if (x, y) in self.pathTiles: self.broken = True
+
+	# fix a broken plan by detouring from start to the first tile after the last wall
+	# on it, falling back to planning the whole thing again
+	def repair(self, start):
+		self.broken = False
+		lastWall = max((i for i, position in enumerate(self.path) if not self.passable(position[0], position[1])), default=-1)
+		if lastWall < 0: return True
+		if lastWall + 1 < len(self.path):
+			detour = self.findPath(start, self.path[lastWall + 1])
+			if detour is not None: return self.follow(self.target, detour + self.path[lastWall + 2:])
+		return self.plan(start, self.target)
+
+	# the next tile of the plan, taking it off the path
+	def nextTile(self):
+		position = self.path.pop(0)
+		self.pathTiles.discard(position)
+		return position
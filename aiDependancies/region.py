@@ -0,0 +1,16 @@
+from aiDependancies.memory import Memory
+
+# everything the agent knows about one part of the world, in that part's own
+# relative coordinates. the agent starts out in one region, and taking stairs to
+# somewhere it can't place yet starts another. there is only one of each kind of
+# stair, so two regions that have both seen the same stair are really one region,
+# and get merged (see AI.mergeRegions)
+class Region:
+	def __init__(self):
+		self.location = [0, 0]     # where the agent is, or was when it left
+		self.memory = Memory()     # known tiles, indexed by relative location
+		self.memory.store(0, 0, 'g')
+		self.frontier = {(0, 0)}   # known, walkable tiles that still have unknown neighbors
+		self.exit = None
+		self.goals = {}            # goal type of each known goal tile, by relative location
+		self.landmarks = {}        # where each kind of stair is, e.g. {'b': (4, -2)}
@@ -5,13 +5,29 @@ tileCharacters = {
 	'r': ' :D '
 }
 
+# bit for each direction in a tile's mask of unknown neighbors
+unknownBits = {
+	'N': 1,
+	'S': 2,
+	'E': 4,
+	'W': 8
+}
+allUnknown = 15
+
 class Tile:
-	def __init__(self, x=0, y=0, cellType='g'):
+	__slots__ = ('relativePosition', 'type', 'unknownMask')
+
+	def __init__(self, x=0, y=0, cellType='g', unknownMask=allUnknown):
 		self.relativePosition = (x, y)       # position in the agent's coordinate system
 		self.type = cellType                 # character corresponding to the cell type
-		self.unknowns = ['N', 'S', 'E', 'W'] # list of which directions are known and which are not
+		self.unknownMask = unknownMask       # bits of which directions are known and which are not
+
+	# list of which directions are still unknown, in the same order as unknownBits
+	@property
+	def unknowns(self):
+		return [direction for direction, bit in unknownBits.items() if self.unknownMask & bit]
 	
 	# again, just some code for terminal output
 	def __str__(self):
 		if self.type not in tileCharacters.keys(): return str(self.type)
-		return tileCharacters[self.type]
\ No newline at end of file
+		return tileCharacters[self.type]
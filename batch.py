@@ -3,22 +3,127 @@ import world
 import misc
 import sim
 import concurrent.futures
+import os
+import random
+import itertools
+import stats
+import agents
+import instrument
+import tracefile
 import matplotlib.pyplot as plt
 
+# most runs handed to a worker at once
+MAX_CHUNK_SIZE = 250
+
+# width, in turns, of the histogram bins
+HISTOGRAM_BIN_WIDTH = 20
+
+# the pristine world each worker process copies from, set once per process
+worker_world = None
+
+# and, for lockstep batches, the numpy form of its map that every chunk shares
+worker_map = None
+
+def init_worker(the_world, lockstep=False):
+    global worker_world, worker_map
+    worker_world = the_world
+    if lockstep:
+        import lockstep as lockstep_sim
+        worker_map = lockstep_sim.StaticMap(the_world)
+
+def run_batch_sim(options, the_world, index, seed, profile=None):
+    # each run gets a trace file of its own, so nothing is shared between processes
+    trace = None
+    if options["trace_dir"] is not None:
+        trace = tracefile.TraceWriter(trace_filename(options["trace_dir"], index), the_world, seed, options["agent"])
+
+    # file handles can't be shared between processes, so each run appends to the log itself
+    log = None
+    if options["log_filename"] is not None and not options["headless"]:
+        log = open(options["log_filename"], 'a')
+    try:
+        if options["headless"]:
+            return sim.run_sim(
+                the_world, options["max_turns"], headless=True, seed=seed, agent=options["agent"],
+                turn_budget=options["turn_budget"], episode_budget=options["episode_budget"],
+                profile=profile, trace=trace
+            )
+        return sim.run_sim(
+            the_world, options["max_turns"], log, options["use_display"], options["display_speed"], index,
+            seed=seed, agent=options["agent"], turn_budget=options["turn_budget"], episode_budget=options["episode_budget"],
+            profile=profile, trace=trace
+        )
+    finally:
+        if log is not None:
+            log.close()
+        if trace is not None:
+            trace.close()
+
+def trace_filename(trace_dir, index):
+    return os.path.join(trace_dir, f"run_{index}.trace")
+
+def run_batch_chunk(indices, seed, options):
+    # run a consecutive share of the batch, summarizing it here so only the summary goes back
+    chunk_stats = stats.TurnStats(HISTOGRAM_BIN_WIDTH)
+
+    # or advance the whole chunk together on the worker's (untouched) world
+    if options["lockstep"]:
+        import lockstep as lockstep_sim
+        seeds = [sim.derive_seed(seed, index) for index in indices]
+        results = lockstep_sim.LockstepSim(
+            worker_world, seeds, options["max_turns"], options["agent"],
+            options["turn_budget"], options["episode_budget"], worker_map
+        ).run()
+        for index, result in zip(indices, results):
+            chunk_stats.add_result(result, index)
+        return chunk_stats
+
+    # every run mutates its world (goals get swapped out), so the chunk's runs share an
+    # episode of the worker's world, put back the way it was after each of them
+    the_world = worker_world.new_episode()
+    profile = instrument.RunProfile() if options["measure"] else None
+    for index in indices:
+        if index == options["profile_index"]:
+            result = instrument.profile_call(
+                profile_filename(index), run_batch_sim, options, the_world, index, sim.derive_seed(seed, index), profile
+            )
+        else:
+            result = run_batch_sim(options, the_world, index, sim.derive_seed(seed, index), profile)
+        the_world.reset()
+        chunk_stats.add_result(result, index)
+    if profile is not None:
+        chunk_stats.add_profile(profile)
+    return chunk_stats
+
+def profile_filename(index):
+    return f"out/profile_{index}.pstats"
+
 def main():
 
     world_filename = None
     log_filename = None
-    log = None
     max_turns = None
     batches = 1
+    workers = os.cpu_count() or 1
     the_world = None
     use_display = False
     display_speed = 0.5
+    compact = False
+    chunked = False
+    headless = False
+    lockstep = False
+    seed = None
+    agent = None
+    turn_budget = None
+    episode_budget = None
+    measure = False
+    profile_index = None
+    trace_dir = None
 
     args = sys.argv
 
-    turn_counts = []
+    turn_stats = stats.TurnStats(HISTOGRAM_BIN_WIDTH)
+    interval = None
 
     if "-w" not in args:
         print("Map argument missing. Run with -h for help.")
@@ -30,7 +135,22 @@ Help:
 -l <FILE_PATH>   | runs sim and prints log to file
 -d <FRAME_TIME>  | displays and updates sim every FRAME_TIME seconds
 -t <TURN_COUNT>  | only runs sim for a maximum of TURN_COUNT steps
+-c               | stores the map as a compact byte grid
+-z               | stores the map in memory-mapped chunks, for maps too big for memory
 -b <NUM_BATCHES> | runs NUM_BATCHES simulations in parallel and prints stats
+-j <NUM_WORKERS> | uses NUM_WORKERS processes (defaults to the cpu count)
+-q               | runs headless: no logging or display, just the stats
+-v               | runs each worker's share of the batch in lockstep with numpy (implies -q;
+                 | can't be used with -m, -P or -r, and is only faster than -q when the
+                 | agent's own update is cheap next to the sim's)
+-s <SEED>        | derives every run's seed from SEED (random if not given)
+-i <NUM_RUNS>    | prints the stats so far after every NUM_RUNS runs
+-a <MODULE:CLASS>| runs this agent instead of ai:AI
+-x <SECONDS>     | ends a run if the agent takes longer than SECONDS on one turn
+-e <SECONDS>     | ends a run if the agent takes longer than SECONDS in total
+-m               | times each phase of every turn and counts rays cast, BFS nodes and memory grows
+-P <INDEX>       | profiles run INDEX with cProfile, saving it to out/profile_<INDEX>.pstats
+-r <DIR_PATH>    | records a binary trace of every run to DIR_PATH/run_<INDEX>.trace
 """)
 
     i = 1
@@ -46,6 +166,10 @@ Help:
                     display_speed = float(args[i+1])
                 except:
                     pass
+            elif args[i] == "-c":
+                compact = True
+            elif args[i] == "-z":
+                chunked = True
             elif args[i] == "-t":
                 try:
                     max_turns = int(args[i+1])
@@ -56,45 +180,146 @@ Help:
                     batches = int(args[i+1])
                 except TypeError:
                     print(f"batch size must be an int: {args[i+1]}")
+            elif args[i] == "-s":
+                try:
+                    seed = int(args[i+1])
+                except ValueError:
+                    print(f"seed must be an int: {args[i+1]}")
+            elif args[i] == "-i":
+                try:
+                    interval = int(args[i+1])
+                except ValueError:
+                    print(f"interval must be an int: {args[i+1]}")
+            elif args[i] == "-a":
+                agent = args[i+1]
+            elif args[i] == "-x":
+                try:
+                    turn_budget = float(args[i+1])
+                except ValueError:
+                    print(f"turn budget must be a number: {args[i+1]}")
+            elif args[i] == "-e":
+                try:
+                    episode_budget = float(args[i+1])
+                except ValueError:
+                    print(f"episode budget must be a number: {args[i+1]}")
+            elif args[i] == "-r":
+                trace_dir = args[i+1]
+            elif args[i] == "-m":
+                measure = True
+            elif args[i] == "-P":
+                try:
+                    profile_index = int(args[i+1])
+                except ValueError:
+                    print(f"profile index must be an int: {args[i+1]}")
+            elif args[i] == "-v":
+                lockstep = True
+                headless = True
+            elif args[i] == "-q":
+                headless = True
+            elif args[i] == "-j":
+                try:
+                    workers = int(args[i+1])
+                except ValueError:
+                    print(f"worker count must be an int: {args[i+1]}")
         except IndexError:
             print("Incorrect command line arguments. Run with -h for help.")
             return
 
         i+=1
 
+    # lockstep runs have no per-run sim loop to measure, profile or trace
+    if lockstep and (measure or profile_index is not None or trace_dir is not None):
+        print("-v can't be used with -m, -P or -r. Run with -h for help.")
+        return
+
+    # truncate the log here; the workers only ever append to it
     if log_filename is not None:
-        log = open(log_filename, 'w')
-        
+        open(log_filename, 'w').close()
+
     try:
-        the_world = world.World(world_filename)
+        # parse the world once, then hand each worker process its own copy
+        if chunked:
+            the_world = world.ChunkedWorld(world_filename)
+        elif compact:
+            the_world = world.CompactWorld(world_filename)
+        else:
+            the_world = world.World(world_filename)
         the_world.load_world()
 
-        with concurrent.futures.ThreadPoolExecutor(max_workers=batches) as executor:
-            world_list   = [the_world     for i in range(batches)]
-            turn_list    = [max_turns     for i in range(batches)]
-            log_list     = [log           for i in range(batches)]
-            display_list = [use_display   for i in range(batches)]
-            speed_list   = [display_speed for i in range(batches)]
-            index_list   = range(batches)
-            turn_counts = list(executor.map(sim.run_sim, world_list, turn_list, log_list, display_list, speed_list, index_list))
-        # for i in range(batches):
-        #     turn_counts.append(sim.run_sim(the_world, max_turns, log, use_display, display_speed))
-        #     print(f"Batch {i+1} complete after {turn_counts[-1]} turns")
-    except misc.InvalidCellException as e:
+        # without a seed, pick one anyway so any run of the batch can be replayed
+        if seed is None:
+            seed = random.getrandbits(32)
+        print(f"Batch seed: {seed}")
+
+        # fail on a bad agent spec here rather than in every worker
+        agents.load_agent(agent)
+
+        # everything a worker needs to know about how to run its share
+        options = {
+            "max_turns": max_turns,
+            "log_filename": log_filename,
+            "use_display": use_display,
+            "display_speed": display_speed,
+            "headless": headless,
+            "lockstep": lockstep,
+            "agent": agent,
+            "turn_budget": turn_budget,
+            "episode_budget": episode_budget,
+            "measure": measure,
+            "profile_index": profile_index,
+            "trace_dir": trace_dir
+        }
+
+        if trace_dir is not None:
+            os.makedirs(trace_dir, exist_ok=True)
+        if profile_index is not None:
+            os.makedirs(os.path.dirname(profile_filename(profile_index)), exist_ok=True)
+
+        workers = max(1, min(workers, batches))
+        chunk_size = max(1, min(MAX_CHUNK_SIZE, batches // (workers * 4)))
+        chunks = (
+            range(start, min(start + chunk_size, batches))
+            for start in range(0, batches, chunk_size)
+        )
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=init_worker,
+            initargs=(the_world, lockstep)
+        ) as executor:
+            # keep only a couple of chunks per worker in flight, so memory stays
+            # constant however many runs there are
+            pending = set()
+            for chunk in itertools.islice(chunks, workers * 2):
+                pending.add(executor.submit(run_batch_chunk, chunk, seed, options))
+
+            reported = 0
+            while pending:
+                done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    turn_stats.merge(future.result())
+                    for chunk in itertools.islice(chunks, 1):
+                        pending.add(executor.submit(run_batch_chunk, chunk, seed, options))
+
+                # print running stats every so often during long batches
+                if interval and turn_stats.running.count < batches and turn_stats.running.count // interval > reported:
+                    reported = turn_stats.running.count // interval
+                    print(f"--- {turn_stats.running.count}/{batches} runs ---")
+                    print("\n".join(turn_stats.summary()))
+    except (misc.InvalidCellException, misc.InvalidWorldException, misc.InvalidAgentException) as e:
         print(e)
     finally:
-        if log is not None:
-            log.close()
-        turn_counts.sort()
-        print(f"Min turn count: {turn_counts[0]}")
-        print(f"Q1 turn count: {turn_counts[batches // 4]}")
-        print(f"Median turn count: {turn_counts[batches // 2]}")
-        print(f"Q3 turn count: {turn_counts[3*(batches // 4)]}")
-        print(f"Max turn count: {turn_counts[-1]}")
-        print(f"Mean turn count: {sum(turn_counts)/batches:.2f}")
-
-        plt.hist(turn_counts, bins=30)
-        plt.savefig('out/histogram.pdf')
+        if turn_stats.running.count:
+            print("\n".join(turn_stats.summary()))
+            print(f"Slowest run: {turn_stats.slowest} (replay with -s {sim.derive_seed(seed, turn_stats.slowest)} in main.py)")
+
+            edges, counts = turn_stats.histogram.edges_and_counts()
+            plt.bar(edges, counts, width=turn_stats.histogram.bin_width, align='edge')
+            os.makedirs('out', exist_ok=True)
+            plt.savefig('out/histogram.pdf')
+
+        if profile_index is not None and os.path.exists(profile_filename(profile_index)):
+            print(f"Profile of run {profile_index}:")
+            instrument.print_profile(profile_filename(profile_index))
 
 
 
@@ -0,0 +1,304 @@
+import sys
+import os
+import json
+import tempfile
+import time
+import world
+import agents
+import sim
+import worldgen
+
+# maps benchmarked when none are given with -w (worldD can only be finished by
+# taking stairs out of a dead end again, so a stuck agent shows up in its turn count)
+DEFAULT_WORLDS = ['worlds/worldA', 'worlds/worldB', 'worlds/worldC', 'worlds/worldD']
+
+# sizes of the synthetic maps benchmarked alongside them
+DEFAULT_SYNTHETIC_SIZES = [64, 128]
+
+# how much slower (as a fraction) a metric can get before it counts as a regression
+DEFAULT_TOLERANCE = 0.2
+
+def percentile(samples, fraction):
+    # nearest-rank percentile of already sorted samples
+    if not samples:
+        return 0.0
+    index = min(len(samples) - 1, max(0, int(round(fraction * len(samples))) - 1))
+    return samples[index]
+
+def summarize(samples):
+    # latency summary of a list of timings, in seconds
+    samples = sorted(samples)
+    return {
+        "count": len(samples),
+        "mean": sum(samples) / len(samples) if samples else 0.0,
+        "p50": percentile(samples, 0.50),
+        "p90": percentile(samples, 0.90),
+        "p99": percentile(samples, 0.99),
+        "max": samples[-1] if samples else 0.0
+    }
+
+def write_synthetic_world(size, directory):
+    # a generated maze with a few loops, stairs and goals, the same every time for a given size
+    path = os.path.join(directory, f"synthetic{size}")
+    return worldgen.write_world(path, size, size, seed=size, loops=0.05, stair_pairs=2, goals=5)
+
+def load(world_filename, use_cache=True):
+    the_world = world.World(world_filename)
+    the_world.load_world(use_cache)
+    return the_world
+
+def bench_load_world(world_filename, repeats, use_cache=False):
+    samples = []
+    for i in range(repeats):
+        start = time.perf_counter()
+        load(world_filename, use_cache)
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+def bench_get_percepts(the_world, repeats):
+    # every enterable cell, looked up cold once and then warm
+    cells = [
+        (x, y)
+        for y in range(the_world.get_height())
+        for x in range(the_world.get_width())
+        if the_world.is_cell_enterable(x, y)
+    ]
+    facing = the_world.get_start_face_dir()
+    samples = []
+    for i in range(repeats):
+        for x, y in cells:
+            start = time.perf_counter()
+            sim.get_percepts(the_world, x, y, facing)
+            samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+def bench_check_triggers(the_world, repeats):
+    cells = [
+        (x, y)
+        for y in range(the_world.get_height())
+        for x in range(the_world.get_width())
+        if the_world.is_cell_enterable(x, y)
+    ]
+    samples = []
+    for i in range(repeats):
+        for x, y in cells:
+            # 'U' on goals would change the map, so only time it on everything else
+            cmd = 'N' if the_world.get_cell(x, y) in world.World.GOAL_CELLS else 'U'
+            start = time.perf_counter()
+            the_world.check_triggers(x, y, cmd)
+            samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+def bench_runs(world_filename, runs, max_turns, seed, agent):
+    # full headless runs, timing each phase of every turn along the way
+    update_samples = []
+    search_samples = []
+    turn_samples = []
+
+    for i in range(runs):
+        the_world = load(world_filename)
+        the_ai = agents.load_agent(agent)(sim.derive_seed(seed, i))
+
+        # time every search the agent makes without changing what it does
+        if hasattr(the_ai, "findClosestUnknown"):
+            find_closest_unknown = the_ai.findClosestUnknown
+            def timed_search():
+                start = time.perf_counter()
+                path = find_closest_unknown()
+                search_samples.append(time.perf_counter() - start)
+                return path
+            the_ai.findClosestUnknown = timed_search
+
+        agent_x, agent_y = the_world.get_startxy()
+        agent_facing = the_world.get_start_face_dir()
+        turn = 0
+        while max_turns is None or turn < max_turns:
+            turn_start = time.perf_counter()
+            percepts = sim.get_percepts(the_world, agent_x, agent_y, agent_facing)
+            update_start = time.perf_counter()
+            agent_cmd = the_ai.update(percepts)
+            update_samples.append(time.perf_counter() - update_start)
+            if not sim.validate_agent_cmd(agent_cmd):
+                break
+            agent_x, agent_y, trigger = sim.apply_command(the_world, agent_x, agent_y, agent_cmd)
+            turn_samples.append(time.perf_counter() - turn_start)
+            turn += 1
+            if trigger[0] == "EXIT":
+                break
+
+    # then the same runs again through run_sim, with nothing timed inside them, for throughput
+    total = 0.0
+    turns = 0
+    for i in range(runs):
+        the_world = load(world_filename)
+        start = time.perf_counter()
+        result = sim.run_sim(the_world, max_turns, headless=True, seed=sim.derive_seed(seed, i), agent=agent)
+        total += time.perf_counter() - start
+        turns += result.turns
+
+    return {
+        "ai_update": summarize(update_samples),
+        "find_closest_unknown": summarize(search_samples),
+        "turn": summarize(turn_samples),
+        "run_sim": {
+            "runs": runs,
+            "mean_turns": turns / runs,
+            "sims_per_second": runs / total if total else 0.0,
+            "turns_per_second": turns / total if total else 0.0
+        }
+    }
+
+def bench_world(world_filename, repeats, runs, max_turns, seed, agent):
+    the_world = load(world_filename)
+    results = {
+        "size": [the_world.get_width(), the_world.get_height()],
+        "load_world": bench_load_world(world_filename, repeats),
+        "load_world_cached": bench_load_world(world_filename, repeats, True),
+        "get_percepts": bench_get_percepts(the_world, repeats),
+        "check_triggers": bench_check_triggers(the_world, repeats)
+    }
+    results.update(bench_runs(world_filename, runs, max_turns, seed, agent))
+    return results
+
+def compare(results, baseline, tolerance):
+    # list every latency mean, throughput and turn count that got worse than the baseline allows
+    regressions = []
+    for name, metrics in results["worlds"].items():
+        if name not in baseline.get("worlds", {}):
+            continue
+        base = baseline["worlds"][name]
+        for metric, values in metrics.items():
+            if metric not in base or not isinstance(values, dict):
+                continue
+            if "mean" in values and base[metric]["mean"] > 0:
+                ratio = values["mean"] / base[metric]["mean"]
+                if ratio > 1 + tolerance:
+                    regressions.append(f"{name} {metric}: mean {ratio:.2f}x slower")
+            if "sims_per_second" in values and values["sims_per_second"] > 0:
+                ratio = base[metric]["sims_per_second"] / values["sims_per_second"]
+                if ratio > 1 + tolerance:
+                    regressions.append(f"{name} {metric}: throughput {ratio:.2f}x lower")
+            if "mean_turns" in values and base[metric]["mean_turns"] > 0:
+                ratio = values["mean_turns"] / base[metric]["mean_turns"]
+                if ratio > 1 + tolerance:
+                    regressions.append(f"{name} {metric}: {ratio:.2f}x more turns")
+    return regressions
+
+def print_results(results):
+    for name, metrics in results["worlds"].items():
+        print(f"{name} ({metrics['size'][0]}x{metrics['size'][1]})")
+        for metric, values in metrics.items():
+            if metric == "size":
+                continue
+            if "mean" in values:
+                print(f"    {metric:22} mean {values['mean']*1e6:10.2f} us   p50 {values['p50']*1e6:10.2f} us   p99 {values['p99']*1e6:10.2f} us   n={values['count']}")
+            else:
+                print(f"    {metric:22} {values['sims_per_second']:10.2f} sims/s   {values['turns_per_second']:10.0f} turns/s   {values['mean_turns']:.1f} turns/run")
+
+def main():
+
+    world_filenames = []
+    synthetic_sizes = list(DEFAULT_SYNTHETIC_SIZES)
+    sizes_given = False
+    repeats = 3
+    runs = 20
+    max_turns = 10000
+    seed = 0
+    output_filename = None
+    baseline_filename = None
+    tolerance = DEFAULT_TOLERANCE
+    agent = None
+
+    args = sys.argv
+
+    if "-h" in args:
+        print("""
+Help:
+-w <FILE_PATH>   | benchmarks the specified world file (repeatable, defaults to worlds A-D)
+-g <SIZE>        | benchmarks a generated SIZExSIZE maze instead of the default 64 and 128 (repeatable)
+-n <RUNS>        | number of full simulations per map
+-r <REPEATS>     | number of passes for the micro benchmarks
+-t <TURN_COUNT>  | caps each simulation at TURN_COUNT turns
+-s <SEED>        | seeds the agents' randomness
+-a <MODULE:CLASS>| benchmarks this agent instead of ai:AI
+-o <FILE_PATH>   | saves the results as a JSON baseline
+-c <FILE_PATH>   | compares the results against a JSON baseline, failing on regressions
+-f <FRACTION>    | allowed slowdown before a metric counts as a regression
+""")
+        return
+
+    i = 1
+    while i < len(args):
+        try:
+            if args[i] == "-w":
+                world_filenames.append(args[i+1])
+            elif args[i] == "-g":
+                # the first -g replaces the default sizes, later ones add to it
+                if not sizes_given:
+                    synthetic_sizes = []
+                    sizes_given = True
+                synthetic_sizes.append(int(args[i+1]))
+            elif args[i] == "-n":
+                runs = int(args[i+1])
+            elif args[i] == "-r":
+                repeats = int(args[i+1])
+            elif args[i] == "-t":
+                max_turns = int(args[i+1])
+            elif args[i] == "-a":
+                agent = args[i+1]
+            elif args[i] == "-s":
+                seed = int(args[i+1])
+            elif args[i] == "-o":
+                output_filename = args[i+1]
+            elif args[i] == "-c":
+                baseline_filename = args[i+1]
+            elif args[i] == "-f":
+                tolerance = float(args[i+1])
+        except IndexError:
+            print("Incorrect command line arguments. Run with -h for help.")
+            return
+        except ValueError:
+            print(f"{args[i]} expects a number: {args[i+1]}")
+            return
+
+        i+=1
+
+    if not world_filenames:
+        world_filenames = list(DEFAULT_WORLDS)
+
+    results = {
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "seed": seed,
+        "runs": runs,
+        "worlds": {}
+    }
+
+    with tempfile.TemporaryDirectory() as directory:
+        for size in synthetic_sizes:
+            world_filenames.append(write_synthetic_world(size, directory))
+
+        for world_filename in world_filenames:
+            name = os.path.basename(world_filename)
+            results["worlds"][name] = bench_world(world_filename, repeats, runs, max_turns, seed, agent)
+
+    print_results(results)
+
+    if output_filename is not None:
+        with open(output_filename, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved baseline to {output_filename}")
+
+    if baseline_filename is not None:
+        with open(baseline_filename, 'r') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, tolerance)
+        for regression in regressions:
+            print(f"REGRESSION: {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions against {baseline_filename}")
+
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+import sys
+import asyncio
+import json
+import agents
+import misc
+import sim
+import server
+
+# Plays episodes served by server.py with any agent (ai.AI by default), one
+# connection per episode. Several episodes can be kept open at once to load the server.
+
+async def play_episode(socket_path, port, agent_class, seed):
+    if port is not None:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port, limit=server.MAX_LINE)
+    else:
+        reader, writer = await asyncio.open_unix_connection(socket_path, limit=server.MAX_LINE)
+
+    the_ai = agent_class(seed)
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                return None
+            message = json.loads(line)
+            if message["type"] == "result":
+                return sim.SimResult(message["turns"], message["score"], message["state"], message["goals"])
+            agent_cmd = the_ai.update(message["percepts"])
+            writer.write(json.dumps({"command": agent_cmd}).encode() + b"\n")
+            await writer.drain()
+    finally:
+        writer.close()
+
+async def play(socket_path, port, agent_class, episodes, concurrency, seed):
+    # keep up to concurrency episodes open until all of them are done
+    slots = asyncio.Semaphore(concurrency)
+
+    async def play_one(index):
+        async with slots:
+            return await play_episode(socket_path, port, agent_class, sim.derive_seed(seed, index))
+
+    return await asyncio.gather(*(play_one(i) for i in range(episodes)))
+
+def main():
+
+    socket_path = server.DEFAULT_SOCKET
+    port = None
+    episodes = 1
+    concurrency = 1
+    seed = 0
+    agent = None
+
+    args = sys.argv
+
+    if "-h" in args:
+        print("""
+Help:
+-u <FILE_PATH>   | connects to the server on this unix socket (defaults to /tmp/microworld.sock)
+-p <PORT>        | connects to the server on this local TCP port instead
+-n <NUM_EPISODES>| plays NUM_EPISODES episodes
+-j <NUM_OPEN>    | keeps up to NUM_OPEN episodes open at once
+-s <SEED>        | derives every episode's seed from SEED
+-a <MODULE:CLASS>| plays with this agent instead of ai:AI
+""")
+        return
+
+    i = 1
+    while i < len(args):
+        try:
+            if args[i] == "-u":
+                socket_path = args[i+1]
+            elif args[i] == "-p":
+                port = int(args[i+1])
+            elif args[i] == "-n":
+                episodes = int(args[i+1])
+            elif args[i] == "-j":
+                concurrency = int(args[i+1])
+            elif args[i] == "-a":
+                agent = args[i+1]
+            elif args[i] == "-s":
+                seed = int(args[i+1])
+        except IndexError:
+            print("Incorrect command line arguments. Run with -h for help.")
+            return
+        except ValueError:
+            print(f"{args[i]} expects a number: {args[i+1]}")
+            return
+
+        i+=1
+
+    try:
+        agent_class = agents.load_agent(agent)
+    except misc.InvalidAgentException as e:
+        print(e)
+        return
+
+    results = asyncio.run(play(socket_path, port, agent_class, episodes, concurrency, seed))
+    for index, result in enumerate(results):
+        if result is None:
+            print(f"episode {index}: disconnected")
+        else:
+            print(f"episode {index}: {result.state} after {result.turns} turns, score {result.score}")
+
+
+
+if __name__ == "__main__":
+    main()
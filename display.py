@@ -1,7 +1,65 @@
+import os
+import zlib
 import pygame
+import pygame.freetype
+
+# Draws the static map once onto a background surface, then each frame only
+# restores and redraws the cells that changed: where the agent was, where it
+# is now, and anything the world reports as changed (e.g. swapped goals).
+#
+# With an exporter the display runs offscreen on SDL's dummy driver (no window
+# needed) and hands every frame to the exporter instead.
+
+class FrameExporter:
+    # saves frames as numbered PNGs in a directory, or as one animated GIF if the
+    # path ends in .gif (which needs Pillow). only every stride-th frame is kept
+    def __init__(self, path, stride=1, frame_time=0.1):
+        self.path = path
+        self.stride = max(1, stride)
+        self.frame_time = frame_time
+        self.gif = path.lower().endswith(".gif")
+        self.count = 0
+        self.saved = 0
+
+        # gif frames have to be kept until the end, so they are kept compressed
+        self.frames = []
+        self.size = None
+
+        if not self.gif:
+            os.makedirs(path, exist_ok=True)
+
+    def add(self, surface):
+        self.count += 1
+        if (self.count - 1) % self.stride:
+            return
+        if self.gif:
+            self.size = surface.get_size()
+            self.frames.append(zlib.compress(pygame.image.tobytes(surface, "RGB"), 1))
+        else:
+            pygame.image.save(surface, os.path.join(self.path, f"frame_{self.saved:05}.png"))
+        self.saved += 1
+
+    def close(self):
+        if not self.gif or not self.frames:
+            return
+        from PIL import Image
+        images = (Image.frombytes("RGB", self.size, zlib.decompress(frame)) for frame in self.frames)
+
+        # the map's few colors all show up in the first frame, so every frame can share its
+        # palette, which is far quicker than letting each frame pick and optimize its own
+        first = next(images).quantize(dither=Image.Dither.NONE)
+        first.save(
+            self.path,
+            save_all=True,
+            append_images=(image.quantize(palette=first, dither=Image.Dither.NONE) for image in images),
+            duration=int(self.frame_time * 1000),
+            loop=0,
+            optimize=False
+        )
+        self.frames = []
 
 class Display:
-    def __init__(self, the_world, agent_x, agent_y):
+    def __init__(self, the_world, agent_x, agent_y, exporter=None):
         self.cell_size = 15
         self.screen_w = self.cell_size * the_world.get_width()
         self.screen_h = self.cell_size * the_world.get_height()
@@ -36,6 +94,11 @@ class Display:
             '5', '6', '7', '8', '9'
         ]
 
+        # frames only go to the exporter, so there is no need for a real window
+        self.exporter = exporter
+        if exporter is not None:
+            os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
         pygame.init()
         self.screen = pygame.display.set_mode(
             (self.screen_w, self.screen_h)
@@ -45,40 +108,76 @@ class Display:
         self.agent_x = agent_x
         self.agent_y = agent_y
         self.font = pygame.freetype.Font(
-            self.font_name, 
+            self.font_name,
             self.font_size
         )
 
+        # glyphs are rendered once each, the first time they are drawn
+        self.glyphs = {}
+
+        # the map without the agent, kept in sync with the world's changes
+        self.world.track_changes()
+        self.world.take_changes()
+        self.background = pygame.Surface((self.screen_w, self.screen_h))
+        self.background.fill("black")
+        for x in range(0, self.cells_w):
+            for y in range(0, self.cells_h):
+                self.draw_cell(x, y)
+        self.screen.blit(self.background, (0, 0))
+        self.full_redraw = True
+
+    def cell_rect(self, x, y):
+        return pygame.Rect(
+            x*self.cell_size,
+            y*self.cell_size,
+            self.cell_size,
+            self.cell_size
+        )
+
+    def glyph(self, cell):
+        if cell not in self.glyphs:
+            self.glyphs[cell] = self.font.render(cell)
+        return self.glyphs[cell]
+
+    def draw_cell(self, x, y):
+        # (re)draw one cell of the background from the world
+        if not self.world.is_valid_cell(x, y):
+            return
+        cell = self.world.get_cell(x, y)
+        rect = self.cell_rect(x, y)
+        pygame.draw.rect(
+            self.background,
+            self.color_key[cell],
+            rect
+        )
+        if cell in self.text:
+            surface, glyph_rect = self.glyph(cell)
+            self.background.blit(
+                surface,
+                (
+                    rect.x + self.cell_size//2 - glyph_rect.w//2,
+                    rect.y + self.cell_size//2 - glyph_rect.h//2
+                )
+            )
+
     def update(self, agent_x, agent_y, facing):
         for event in pygame.event.get():
             pass
 
+        # cells to restore from the background: the agent's old and new ones, and any that changed
+        dirty = {(self.agent_x, self.agent_y), (agent_x, agent_y)}
+        for x, y in self.world.take_changes():
+            self.draw_cell(x, y)
+            dirty.add((x, y))
+
         self.agent_x = agent_x
         self.agent_y = agent_y
-        self.screen.fill("black")
-        for x in range(0, self.cells_w):
-            for y in range(0, self.cells_h):
-                if self.world.is_valid_cell(x, y):
-                    cell = self.world.get_cell(x, y)
-                    pygame.draw.rect(
-                        self.screen,
-                        self.color_key[cell],
-                        pygame.Rect(
-                            x*self.cell_size,
-                            y*self.cell_size,
-                            x*self.cell_size+self.cell_size,
-                            y*self.cell_size+self.cell_size
-                        )
-                    )
-                    if cell in self.text:
-                        surface, rect = self.font.render(cell)
-                        self.screen.blit(
-                            surface,
-                            (
-                                x*self.cell_size + self.cell_size//2 - rect.w//2,
-                                y*self.cell_size + self.cell_size//2 - rect.h//2
-                            )
-                        )
+        rects = []
+        for x, y in dirty:
+            rect = self.cell_rect(x, y)
+            self.screen.blit(self.background, rect, rect)
+            rects.append(rect)
+
         cx = self.agent_x*self.cell_size + self.cell_size//2
         cy = self.agent_y*self.cell_size + self.cell_size//2
         pygame.draw.circle(
@@ -104,7 +203,17 @@ class Display:
             2
         )
 
-        pygame.display.flip()
+        # the first frame shows the whole map, every later one just the dirty cells
+        if self.full_redraw:
+            pygame.display.flip()
+            self.full_redraw = False
+        else:
+            pygame.display.update(rects)
+
+        if self.exporter is not None:
+            self.exporter.add(self.screen)
 
     def quit(self):
+        if self.exporter is not None:
+            self.exporter.close()
         pygame.quit()
@@ -0,0 +1,72 @@
+import cProfile
+import pstats
+
+# Where a simulation spends its time, and how much work the hot paths do.
+# run_sim fills in a RunProfile when given one; profiles of many runs merge
+# into one, so batch.py can report totals the same way it does turn counts.
+
+# the phases of a turn, in the order they happen
+PHASES = ["percepts", "update", "move", "log", "display"]
+
+# rows of a cProfile capture printed after a run
+PROFILE_LINES = 25
+
+def read_counters(the_world, the_ai):
+    # the work counters kept by the world, the agent and its memory (agents without them count 0)
+    counters = {
+        "rays_cast": the_world.rays_cast,
+        "bfs_nodes": getattr(the_ai, "nodesExpanded", 0),
+        "plan_nodes": getattr(getattr(the_ai, "planner", None), "nodesExpanded", 0),
+        "memory_grows": getattr(getattr(the_ai, "memory", None), "grows", 0)
+            + sum(region.memory.grows for region in getattr(the_ai, "regions", ()))
+    }
+    # and how often a ChunkedWorld had to bring a chunk in
+    if hasattr(the_world, "chunk_loads"):
+        counters["chunk_loads"] = the_world.chunk_loads
+    return counters
+
+class RunProfile:
+    def __init__(self):
+        self.runs = 0
+        self.turns = 0
+        self.phases = dict.fromkeys(PHASES, 0.0) # seconds spent in each phase
+        self.counters = {}
+
+    def add_run(self, turns, phases, counters):
+        self.runs += 1
+        self.turns += turns
+        for phase, seconds in phases.items():
+            self.phases[phase] += seconds
+        for name, count in counters.items():
+            self.counters[name] = self.counters.get(name, 0) + count
+
+    def merge(self, other):
+        self.runs += other.runs
+        self.turns += other.turns
+        for phase, seconds in other.phases.items():
+            self.phases[phase] += seconds
+        for name, count in other.counters.items():
+            self.counters[name] = self.counters.get(name, 0) + count
+
+    def summary(self):
+        total = sum(self.phases.values())
+        turns = max(1, self.turns)
+        lines = []
+        for phase in PHASES:
+            seconds = self.phases[phase]
+            share = seconds / total * 100 if total else 0.0
+            lines.append(f"Time in {phase}: {seconds:.6f} s ({share:.1f}%, {seconds / turns * 1e6:.2f} us/turn)")
+        for name, count in self.counters.items():
+            lines.append(f"Total {name}: {count} ({count / max(1, self.runs):.1f}/run, {count / turns:.2f}/turn)")
+        return lines
+
+def profile_call(filename, func, *args, **kwargs):
+    # run func under cProfile, saving the stats to filename for pstats or snakeviz
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(func, *args, **kwargs)
+    finally:
+        profiler.dump_stats(filename)
+
+def print_profile(filename, limit=PROFILE_LINES):
+    pstats.Stats(filename).strip_dirs().sort_stats("cumulative").print_stats(limit)
@@ -0,0 +1,241 @@
+import time
+import numpy as np
+import agents
+import sim
+import world
+
+# Runs many independent agents on one world in lockstep. Positions, scores and
+# states are arrays, and movement, wall checks and trigger lookups are done for
+# the whole batch at once with numpy; only the agents' own decisions stay in
+# Python. The world itself is never modified: each agent sees the shared map
+# through its own copy-on-write overlay of the goals it has triggered.
+#
+# The agents' update calls are most of the cost of a turn, so lockstep only gets
+# ahead of running the same agents one by one (batch.py -q) where the rest of the
+# turn is a fair share: big batches of cheap agents.
+
+# index of each command in the lookup tables below
+COMMAND_CODES = {'N': 0, 'E': 1, 'S': 2, 'W': 3, 'U': 4}
+INVALID_COMMAND = 5
+COMMAND_DX = np.array([0, 1, 0, -1, 0, 0])
+COMMAND_DY = np.array([-1, 0, 1, 0, 0, 0])
+
+# agent states, in the same order as the strings run_sim reports
+STATES = ['GOOD', 'EXITED', 'BAD', 'TIMEOUT']
+GOOD = 0
+EXITED = 1
+BAD = 2
+TIMEOUT = 3
+
+# Everything about a world that lockstep needs and never changes. It is built
+# once per process (see batch.init_worker) and shared by every LockstepSim there.
+class StaticMap:
+    def __init__(self, the_world):
+        width = the_world.get_width()
+        height = the_world.get_height()
+
+        # the map as character codes, row-major, and the same bytes column-major for the N/S rays
+        self.cells = the_world.map_bytes()
+        self.grid = np.frombuffer(self.cells, dtype=np.uint8).reshape(height, width)
+        self.columns = self.grid.T.tobytes()
+        self.enterable = np.isin(self.grid, [ord(cell) for cell in world.World.WALL_CELLS], invert=True)
+        self.goal_cells = np.isin(self.grid, [ord(cell) for cell in world.World.GOAL_CELLS])
+
+        # sorted positions of every wall in either order, for finding where each ray stops
+        index_type = np.int32 if width*height < 2**31 else np.int64
+        self.walls_by_row = np.flatnonzero(~self.enterable).astype(index_type)
+        self.walls_by_column = np.flatnonzero(~self.enterable.T).astype(index_type)
+
+        # where using each stair teleports to
+        self.teleports = {}
+        for stair, partner in world.World.STAIR_PARTNERS.items():
+            target = the_world.find_cell(partner)
+            if target is None:
+                continue
+            for x, y in the_world.cell_index.get(stair, ()):
+                self.teleports[(x, y)] = target
+
+    def ray_lengths(self, xs, ys):
+        # for every agent at once, how many cells its N, E, S and W rays hold (up to and including
+        # the first wall, as World.prune_raycast leaves them)
+        height, width = self.grid.shape
+        after, before = next_walls(self.walls_by_row, ys*width + xs)
+        east = np.where(after < (ys + 1)*width, after - ys*width, width - 1) - xs
+        west = xs - np.where(before >= ys*width, before - ys*width, 0)
+        after, before = next_walls(self.walls_by_column, xs*height + ys)
+        south = np.where(after < (xs + 1)*height, after - xs*height, height - 1) - ys
+        north = ys - np.where(before >= xs*height, before - xs*height, 0)
+        return north, east, south, west
+
+def next_walls(walls, positions):
+    # the first wall after and the last wall before each position, or past either end if there isn't one
+    if not len(walls):
+        return np.full(len(positions), np.iinfo(walls.dtype).max), np.full(len(positions), -1)
+    k = np.searchsorted(walls, positions, side='right')
+    after = np.where(k < len(walls), walls[np.minimum(k, len(walls) - 1)], np.iinfo(walls.dtype).max)
+    k = np.searchsorted(walls, positions, side='left') - 1
+    before = np.where(k >= 0, walls[np.maximum(k, 0)], -1)
+    return after, before
+
+class LockstepSim:
+    def __init__(self, the_world, seeds, max_turns=None, agent=None, turn_budget=None, episode_budget=None, static_map=None):
+        self.world = the_world
+        self.max_turns = max_turns
+        self.turn_budget = turn_budget
+        self.episode_budget = episode_budget
+        count = len(seeds)
+
+        self.map = static_map if static_map is not None else StaticMap(the_world)
+        self.grid = self.map.grid
+        self.height, self.width = self.grid.shape
+
+        start_x, start_y = the_world.get_startxy()
+        self.facing = the_world.get_start_face_dir()
+        agent_class = agents.load_agent(agent)
+        self.agents = [agent_class(seed) for seed in seeds]
+        self.xs = np.full(count, start_x)
+        self.ys = np.full(count, start_y)
+        self.turns = np.ones(count, dtype=np.int64)
+        self.points = np.full(count, 1000, dtype=np.int64)
+        self.states = np.full(count, GOOD, dtype=np.int8)
+        self.active = np.ones(count, dtype=bool)
+
+        # how long each agent has spent deciding, in seconds (plain lists, since they are
+        # updated one agent at a time, which numpy is slow at)
+        self.think_time = [0.0] * count
+        self.max_think_time = [0.0] * count
+        self.timeout_turns = [None] * count
+
+        # copy-on-write goal state: None until an agent triggers its first goal,
+        # then that agent's own {(x, y): cell} changes on top of the shared map
+        self.overlays = [None] * count
+        self.goals = [[] for i in range(count)]
+
+    def cell(self, i, x, y):
+        # what agent i sees at (x, y)
+        overlay = self.overlays[i]
+        if overlay is not None and (x, y) in overlay:
+            return overlay[(x, y)]
+        return chr(self.grid[y, x])
+
+    def percepts(self, i, x, y, north, east, south, west):
+        # the same percepts as sim.get_percepts, sliced straight out of the map's bytes
+        cells = self.map.cells
+        columns = self.map.columns
+        row_at = y*self.width + x
+        column_at = x*self.height + y
+        percepts = {
+            'X': [chr(cells[row_at])],
+            'N': list(columns[column_at - north:column_at][::-1].decode('ascii')),
+            'E': list(cells[row_at + 1:row_at + 1 + east].decode('ascii')),
+            'S': list(columns[column_at + 1:column_at + 1 + south].decode('ascii')),
+            'W': list(cells[row_at - west:row_at][::-1].decode('ascii'))
+        }
+        overlay = self.overlays[i]
+        if overlay is None:
+            return percepts
+
+        # patch the rays wherever this agent's map differs
+        percepts['X'] = [self.cell(i, x, y)]
+        for d, (dx, dy) in sim.DIRECTIONS.items():
+            ray = percepts[d]
+            for (ox, oy), cell in overlay.items():
+                steps = (ox - x)*dx + (oy - y)*dy
+                if 0 < steps <= len(ray) and (ox, oy) == (x + steps*dx, y + steps*dy):
+                    ray[steps-1] = cell
+        return percepts
+
+    def step(self):
+        # advance every active agent by one turn
+        active = np.flatnonzero(self.active)
+        xs = self.xs[active]
+        ys = self.ys[active]
+        rays = zip(*(lengths.tolist() for lengths in self.map.ray_lengths(xs, ys)))
+        budgeted = self.turn_budget is not None or self.episode_budget is not None
+        clock = time.perf_counter
+        codes = []
+        timed_out = []
+        for i, x, y, (north, east, south, west) in zip(active.tolist(), xs.tolist(), ys.tolist(), rays):
+            percepts = self.percepts(i, x, y, north, east, south, west)
+
+            think_start = clock()
+            agent_cmd = self.agents[i].update(percepts)
+            turn_time = clock() - think_start
+            self.think_time[i] += turn_time
+            if turn_time > self.max_think_time[i]:
+                self.max_think_time[i] = turn_time
+
+            if budgeted and agents.exceeds_budget(turn_time, self.think_time[i], self.turn_budget, self.episode_budget):
+                timed_out.append(i)
+                self.timeout_turns[i] = int(self.turns[i])
+                codes.append(INVALID_COMMAND)
+            else:
+                codes.append(COMMAND_CODES.get(agent_cmd, INVALID_COMMAND))
+        commands = np.full(len(self.agents), INVALID_COMMAND)
+        commands[active] = codes
+
+        # agents out of time stop where they are, without this turn counting
+        self.states[timed_out] = TIMEOUT
+        self.active[timed_out] = False
+
+        invalid = self.active & (commands == INVALID_COMMAND)
+        self.states[invalid] = BAD
+
+        # movement and wall checks for the whole batch
+        nx = self.xs + COMMAND_DX[commands]
+        ny = self.ys + COMMAND_DY[commands]
+        height, width = self.grid.shape
+        inside = (nx >= 0) & (nx < width) & (ny >= 0) & (ny < height)
+        moves = self.active & ~invalid & inside
+        moves[moves] = self.map.enterable[ny[moves], nx[moves]]
+        self.xs = np.where(moves, nx, self.xs)
+        self.ys = np.where(moves, ny, self.ys)
+
+        # triggers, for everyone who used the cell they are on
+        using = self.active & (commands == COMMAND_CODES['U'])
+        cells = self.grid[self.ys, self.xs]
+
+        exits = using & (cells == ord('r'))
+        self.states[exits] = EXITED
+
+        # only a handful of cells are stairs, so they are looked up one user at a time
+        if self.map.teleports:
+            for i in np.flatnonzero(using & ~exits):
+                target = self.map.teleports.get((int(self.xs[i]), int(self.ys[i])))
+                if target is not None:
+                    self.xs[i], self.ys[i] = target
+
+        for i in np.flatnonzero(using & self.map.goal_cells[self.ys, self.xs]):
+            self.trigger_goal(i, int(self.xs[i]), int(self.ys[i]))
+
+        # same bookkeeping as run_sim: running out of turns stops before the turn is counted
+        if self.max_turns is not None:
+            expired = self.active & (self.turns >= self.max_turns)
+        else:
+            expired = np.zeros(len(self.agents), dtype=bool)
+        counted = self.active & ~expired
+        self.points[counted] -= 1
+        self.turns[counted] += 1
+        self.active &= ~expired & (self.states == GOOD)
+
+    def trigger_goal(self, i, x, y):
+        cell = self.cell(i, x, y)
+        if cell not in world.World.GOAL_CELLS:
+            return
+        if self.overlays[i] is None:
+            self.overlays[i] = {}
+        for position in self.world.cell_index.get(cell, ()):
+            self.overlays[i][position] = 'g'
+        self.points[i] += sim.POINTS_PER_GOAL
+        self.goals[i].append(cell)
+
+    def run(self):
+        while self.active.any():
+            self.step()
+        return [
+            sim.SimResult(
+                int(self.turns[i]) - 1, int(self.points[i]), STATES[self.states[i]], self.goals[i],
+                self.think_time[i], self.max_think_time[i], self.timeout_turns[i]
+            )
+            for i in range(len(self.agents))
+        ]
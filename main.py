@@ -2,6 +2,9 @@ import sys
 import world
 import misc
 import sim
+import instrument
+import tracefile
+import replay
 
 def main():
 
@@ -12,14 +15,55 @@ def main():
     the_world = None
     use_display = False
     display_speed = 0.5
+    compact = False
+    chunked = False
+    seed = None
+    agent = None
+    turn_budget = None
+    episode_budget = None
+    profile = None
+    profile_filename = None
+    trace_filename = None
+    trace = None
+    replay_filename = None
+    replay_from = 0
+    export_path = None
+    export_stride = 1
+    exporter = None
 
     args = sys.argv
 
-    if "-w" not in args:
+    if "-w" not in args and "-R" not in args:
         print("Map argument missing. Run with -h for help.")
 
     if "-h" in args:
-        print("Help")
+        print("""
+Help:
+-w <FILE_PATH>   | runs sim using the specified world file
+-l <FILE_PATH>   | runs sim and prints log to file
+-d <FRAME_TIME>  | displays and updates sim every FRAME_TIME seconds
+-t <TURN_COUNT>  | only runs sim for a maximum of TURN_COUNT steps
+-c               | stores the map as a compact byte grid
+-z               | stores the map in memory-mapped chunks, for maps too big for memory
+-s <SEED>        | seeds the agent's randomness, so the same seed gives the same run
+-a <MODULE:CLASS>| runs this agent instead of ai:AI
+-x <SECONDS>     | ends the run if the agent takes longer than SECONDS on one turn
+-e <SECONDS>     | ends the run if the agent takes longer than SECONDS in total
+-m               | times each phase of every turn and counts rays cast, BFS nodes and memory grows
+-P <FILE_PATH>   | profiles the run with cProfile, saving it to FILE_PATH
+-r <FILE_PATH>   | records a binary trace of the run to FILE_PATH
+-R <FILE_PATH>   | replays a recorded trace instead of running the agent (-w defaults to its world)
+-g <TURN>        | starts the replay from TURN
+-o <PATH>        | renders every frame offscreen to a .gif, or to numbered PNGs in a directory
+-k <STRIDE>      | only renders every STRIDE-th frame with -o
+
+Flags shared with batch.py mean the same thing in both. Across the other
+scripts, -o always names a path to write output to, -x is always a per-turn
+time limit, -j is always how many run at once, and -p is the TCP port in
+server.py and client.py (profiling is -P). worldgen.py's other flags describe
+the maze it generates and have nothing to do with these.
+""")
+        return
 
     i = 1
     while i < len(args):
@@ -34,6 +78,47 @@ def main():
                     display_speed = float(args[i+1])
                 except:
                     pass
+            elif args[i] == "-a":
+                agent = args[i+1]
+            elif args[i] == "-x":
+                try:
+                    turn_budget = float(args[i+1])
+                except ValueError:
+                    print(f"turn budget must be a number: {args[i+1]}")
+            elif args[i] == "-e":
+                try:
+                    episode_budget = float(args[i+1])
+                except ValueError:
+                    print(f"episode budget must be a number: {args[i+1]}")
+            elif args[i] == "-R":
+                replay_filename = args[i+1]
+            elif args[i] == "-g":
+                try:
+                    replay_from = int(args[i+1])
+                except ValueError:
+                    print(f"replay turn must be an int: {args[i+1]}")
+            elif args[i] == "-o":
+                export_path = args[i+1]
+            elif args[i] == "-k":
+                try:
+                    export_stride = int(args[i+1])
+                except ValueError:
+                    print(f"frame stride must be an int: {args[i+1]}")
+            elif args[i] == "-r":
+                trace_filename = args[i+1]
+            elif args[i] == "-m":
+                profile = instrument.RunProfile()
+            elif args[i] == "-P":
+                profile_filename = args[i+1]
+            elif args[i] == "-s":
+                try:
+                    seed = int(args[i+1])
+                except ValueError:
+                    print(f"seed must be an int: {args[i+1]}")
+            elif args[i] == "-c":
+                compact = True
+            elif args[i] == "-z":
+                chunked = True
             elif args[i] == "-t":
                 try:
                     max_turns = int(args[i+1])
@@ -49,14 +134,53 @@ def main():
         log = open(log_filename, 'w')
         
     try:
-        the_world = world.World(world_filename)
+        # a replay runs on the world it was recorded on, unless told otherwise
+        reader = None
+        if replay_filename is not None:
+            reader = tracefile.TraceReader(replay_filename)
+            if world_filename is None:
+                world_filename = reader.header["world"]
+
+        if chunked:
+            the_world = world.ChunkedWorld(world_filename)
+        elif compact:
+            the_world = world.CompactWorld(world_filename)
+        else:
+            the_world = world.World(world_filename)
         the_world.load_world()
-        sim.run_sim(the_world, max_turns, log, use_display, display_speed)
-    except misc.InvalidCellException as e:
+
+        # frames go to a .gif, or to numbered PNGs in a directory, at the -d frame time
+        if export_path is not None:
+            import display
+            exporter = display.FrameExporter(export_path, export_stride, display_speed if use_display else 0.1)
+
+        if reader is not None:
+            replay.run_replay(the_world, reader, replay_from, max_turns, log, use_display, display_speed, exporter)
+            return
+
+        if trace_filename is not None:
+            trace = tracefile.TraceWriter(trace_filename, the_world, seed, agent)
+        run_args = (the_world, max_turns, log, use_display, display_speed)
+        run_kwargs = {
+            "seed": seed, "agent": agent, "turn_budget": turn_budget,
+            "episode_budget": episode_budget, "profile": profile, "trace": trace,
+            "exporter": exporter
+        }
+        if profile_filename is not None:
+            instrument.profile_call(profile_filename, sim.run_sim, *run_args, **run_kwargs)
+            instrument.print_profile(profile_filename)
+        else:
+            sim.run_sim(*run_args, **run_kwargs)
+
+        if profile is not None:
+            print("\n".join(profile.summary()))
+    except (misc.InvalidCellException, misc.InvalidWorldException, misc.InvalidAgentException, misc.InvalidTraceException) as e:
         print(e)
     finally:
         if log is not None:
             log.close()
+        if trace is not None:
+            trace.close()
 
 
 
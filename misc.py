@@ -1,5 +1,8 @@
-
 class InvalidCellException(Exception):
     pass
 class InvalidWorldException(Exception):
+    pass
+class InvalidAgentException(Exception):
+    pass
+class InvalidTraceException(Exception):
     pass
\ No newline at end of file
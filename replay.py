@@ -0,0 +1,128 @@
+import bisect
+import collections
+import time
+import misc
+import sim
+
+# Replays a recorded trace (see tracefile.py) by feeding its commands straight
+# to the world, so nothing the agent did has to be recomputed. Snapshots of the
+# replay state are taken every few turns from the records alone, so seeking to
+# a turn only replays the commands since the snapshot before it.
+
+# turns between the snapshots kept for seeking
+SNAPSHOT_INTERVAL = 100
+
+# where the agent was after a turn, its state, and the goals it had triggered by then
+Snapshot = collections.namedtuple("Snapshot", ["turn", "x", "y", "state", "goals"])
+
+class Replay:
+    def __init__(self, the_world, reader, snapshot_interval=SNAPSHOT_INTERVAL):
+        self.pristine = the_world # never modified; every restore starts from a new episode of it
+        self.reader = reader
+        self.records = reader.records
+        self.facing = reader.header["facing"]
+
+        start_x, start_y = reader.header["start"]
+        self.snapshots = [Snapshot(0, start_x, start_y, 'GOOD', ())]
+        goals = []
+        for record in self.records:
+            if record.goal is not None:
+                goals.append(record.goal)
+            if record.turn % snapshot_interval == 0:
+                state = 'EXITED' if record.trigger == "EXIT" else 'BAD' if record.cmd == '?' else 'GOOD'
+                self.snapshots.append(Snapshot(record.turn, record.x, record.y, state, tuple(goals)))
+        self.snapshot_turns = [snapshot.turn for snapshot in self.snapshots]
+
+        self.restore(self.snapshots[0])
+
+    def restore(self, snapshot):
+        self.world = self.pristine.new_episode()
+        self.turn = snapshot.turn
+        self.x = snapshot.x
+        self.y = snapshot.y
+        self.goals = list(snapshot.goals)
+        self.state = snapshot.state
+
+        # trigger the same goals again, in the same order
+        for goal in snapshot.goals:
+            goal_x, goal_y = self.world.find_cell(goal)
+            self.world.check_triggers(goal_x, goal_y, 'U')
+
+    def score(self):
+        # what run_sim's score was at the end of the current turn
+        return 1000 - self.turn + sim.POINTS_PER_GOAL * len(self.goals)
+
+    def step(self):
+        # replay the next recorded turn, returning its record and trigger
+        record = self.records[self.turn]
+        trigger = None
+        if record.cmd == '?':
+            self.state = 'BAD'
+        else:
+            self.x, self.y, trigger = sim.apply_command(self.world, self.x, self.y, record.cmd)
+            if (self.x, self.y) != (record.x, record.y) or trigger[0] != record.trigger:
+                raise misc.InvalidTraceException(
+                    f"{self.reader.filename} no longer matches {self.world.world_filename} at turn {record.turn}"
+                )
+            match trigger[0]:
+                case "EXIT":
+                    self.state = 'EXITED'
+                case "GOAL_TRIGGERED":
+                    self.goals.append(trigger[2])
+        self.turn += 1
+        return record, trigger
+
+    def seek(self, turn):
+        # move to the end of turn, starting from the nearest snapshot unless we are already closer
+        turn = max(0, min(turn, len(self.records)))
+        snapshot = self.snapshots[bisect.bisect_right(self.snapshot_turns, turn) - 1]
+        if not snapshot.turn <= self.turn <= turn:
+            self.restore(snapshot)
+        while self.turn < turn:
+            self.step()
+
+    def done(self):
+        return self.turn >= len(self.records)
+
+def run_replay(the_world, reader, start_turn=0, max_turns=None, log=None, use_display=False, display_speed=0.5, exporter=None):
+    replay = Replay(the_world, reader)
+    replay.seek(start_turn)
+    sim.write_to_log(
+        log,
+        f"Replaying {reader.filename} from turn {replay.turn} at {replay.x},{replay.y} (score {replay.score()})"
+    )
+
+    disp = None
+    if exporter is not None:
+        use_display = True
+        display_speed = 0
+    if use_display:
+        import display
+        disp = display.Display(replay.world, replay.x, replay.y, exporter)
+        disp.update(replay.x, replay.y, replay.facing)
+        time.sleep(display_speed)
+
+    replayed = 0
+    while not replay.done() and (max_turns is None or replayed < max_turns):
+        record, trigger = replay.step()
+        replayed += 1
+        sim.write_to_log(
+            log,
+            f"Turn {record.turn}: {record.cmd} -> {record.x},{record.y}"
+            + (f"   Trigger: {' '.join(str(t) for t in trigger)}" if trigger is not None and trigger[0] != "NONE" else "")
+        )
+        if use_display:
+            disp.update(replay.x, replay.y, replay.facing)
+            time.sleep(display_speed)
+
+    if replay.done() and reader.final is not None:
+        sim.write_to_log(log, f"-----Replay Finished-----")
+        sim.write_to_log(log, f"FINAL AGENT STATE: {reader.final.goal}")
+        sim.write_to_log(log, f"FINAL SCORE: {reader.final.score}")
+
+    if use_display:
+        if exporter is None:
+            time.sleep(3)
+        disp.quit()
+
+    return replay
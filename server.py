@@ -0,0 +1,206 @@
+import sys
+import asyncio
+import json
+import world
+import misc
+import sim
+import stats
+
+# Serves simulations to agents running in other processes. Each connection is
+# one episode: the server sends the agent its percepts every turn as a line of
+# JSON and waits for a line back with its command, e.g.
+#
+#   server -> {"type": "percepts", "turn": 1, "percepts": {"X": ["g"], "N": ["w"], ...}}
+#   agent  -> {"command": "N"}
+#   ...
+#   server -> {"type": "result", "turns": 312, "score": 688, "state": "EXITED", "goals": []}
+#
+# One event loop multiplexes every open episode. An agent that takes longer than
+# the turn timeout to answer ends its episode in the TIMEOUT state.
+
+DEFAULT_SOCKET = "/tmp/microworld.sock"
+
+# longest line an agent may send, in bytes
+MAX_LINE = 64 * 1024
+
+class SimServer:
+    def __init__(self, the_world, max_turns=None, turn_timeout=1.0, max_episodes=10000, interval=None):
+        self.world = the_world
+        self.max_turns = max_turns
+        self.turn_timeout = turn_timeout
+        self.interval = interval
+        self.turn_stats = stats.TurnStats()
+
+        # episodes past the limit wait for a slot before they get their first percepts
+        self.slots = asyncio.Semaphore(max_episodes)
+
+    async def handle(self, reader, writer):
+        try:
+            async with self.slots:
+                result = await self.run_episode(reader, writer)
+                await self.send(writer, {"type": "result", **result._asdict()})
+                self.record(result)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def send(self, writer, message):
+        writer.write(json.dumps(message).encode() + b"\n")
+        # wait for slow readers here instead of buffering without bound
+        await writer.drain()
+
+    async def receive(self, reader):
+        try:
+            line = await asyncio.wait_for(reader.readline(), self.turn_timeout)
+        except ValueError:
+            # a line longer than MAX_LINE, which can't be a valid command either
+            return None
+        if not line:
+            raise ConnectionError("agent disconnected")
+        try:
+            return json.loads(line).get("command")
+        except (ValueError, AttributeError):
+            return None
+
+    async def run_episode(self, reader, writer):
+        # same rules as sim.run_sim_headless, with the agent on the other end of the socket
+        the_world = self.world.new_episode()
+        agent_x, agent_y = the_world.get_startxy()
+        agent_facing = the_world.get_start_face_dir()
+        turn = 1
+        ai_state = 'GOOD'
+        points = 1000
+        goals = []
+        timeout_turn = None
+
+        while ai_state == 'GOOD':
+            percepts = sim.get_percepts(the_world, agent_x, agent_y, agent_facing)
+            await self.send(writer, {"type": "percepts", "turn": turn, "percepts": percepts})
+
+            try:
+                agent_cmd = await self.receive(reader)
+            except asyncio.TimeoutError:
+                ai_state = 'TIMEOUT'
+                timeout_turn = turn
+                break
+
+            if sim.validate_agent_cmd(agent_cmd):
+                agent_x, agent_y, trigger = sim.apply_command(the_world, agent_x, agent_y, agent_cmd)
+                match trigger[0]:
+                    case "EXIT":
+                        ai_state = 'EXITED'
+                    case "GOAL_TRIGGERED":
+                        points += sim.POINTS_PER_GOAL
+                        goals.append(trigger[2])
+            else:
+                ai_state = 'BAD'
+
+            if self.max_turns is not None and turn >= self.max_turns:
+                break
+
+            points -= 1
+            turn += 1
+
+        return sim.SimResult(turn-1, points, ai_state, goals, timeout_turn=timeout_turn)
+
+    def record(self, result):
+        self.turn_stats.add(result.turns, self.turn_stats.running.count)
+        if self.interval and self.turn_stats.running.count % self.interval == 0:
+            print(f"--- {self.turn_stats.running.count} episodes ---")
+            print("\n".join(self.turn_stats.summary()))
+
+    async def serve(self, socket_path=None, port=None):
+        if port is not None:
+            server = await asyncio.start_server(self.handle, "127.0.0.1", port, limit=MAX_LINE)
+            print(f"Serving {self.world.world_filename} on 127.0.0.1:{port}")
+        else:
+            server = await asyncio.start_unix_server(self.handle, socket_path, limit=MAX_LINE)
+            print(f"Serving {self.world.world_filename} on {socket_path}")
+        async with server:
+            await server.serve_forever()
+
+def main():
+
+    world_filename = None
+    max_turns = None
+    compact = False
+    chunked = False
+    socket_path = DEFAULT_SOCKET
+    port = None
+    turn_timeout = 1.0
+    max_episodes = 10000
+    interval = None
+    server = None
+
+    args = sys.argv
+
+    if "-w" not in args:
+        print("Map argument missing. Run with -h for help.")
+
+    if "-h" in args:
+        print("""
+Help:
+-w <FILE_PATH>   | serves simulations of the specified world file
+-t <TURN_COUNT>  | only runs each episode for a maximum of TURN_COUNT steps
+-c               | stores the map as a compact byte grid
+-z               | stores the map in memory-mapped chunks, for maps too big for memory
+-u <FILE_PATH>   | listens on this unix socket (defaults to /tmp/microworld.sock)
+-p <PORT>        | listens on this local TCP port instead
+-x <SECONDS>     | time an agent has to answer each turn (defaults to 1)
+-j <NUM_EPISODES>| most episodes that run at once; the rest wait their turn
+-i <NUM_EPISODES>| prints stats after every NUM_EPISODES finished episodes
+""")
+        return
+
+    i = 1
+    while i < len(args):
+        try:
+            if args[i] == "-w":
+                world_filename = args[i+1]
+            elif args[i] == "-t":
+                max_turns = int(args[i+1])
+            elif args[i] == "-c":
+                compact = True
+            elif args[i] == "-z":
+                chunked = True
+            elif args[i] == "-u":
+                socket_path = args[i+1]
+            elif args[i] == "-p":
+                port = int(args[i+1])
+            elif args[i] == "-x":
+                turn_timeout = float(args[i+1])
+            elif args[i] == "-j":
+                max_episodes = int(args[i+1])
+            elif args[i] == "-i":
+                interval = int(args[i+1])
+        except IndexError:
+            print("Incorrect command line arguments. Run with -h for help.")
+            return
+        except ValueError:
+            print(f"{args[i]} expects a number: {args[i+1]}")
+            return
+
+        i+=1
+
+    try:
+        if chunked:
+            the_world = world.ChunkedWorld(world_filename)
+        elif compact:
+            the_world = world.CompactWorld(world_filename)
+        else:
+            the_world = world.World(world_filename)
+        the_world.load_world()
+
+        server = SimServer(the_world, max_turns, turn_timeout, max_episodes, interval)
+        asyncio.run(server.serve(socket_path, port))
+    except (misc.InvalidCellException, misc.InvalidWorldException) as e:
+        print(e)
+    except KeyboardInterrupt:
+        if server is not None and server.turn_stats.running.count:
+            print("\n".join(server.turn_stats.summary()))
+
+
+
+if __name__ == "__main__":
+    main()
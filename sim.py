@@ -1,7 +1,8 @@
-import world
-import ai
-import display
+import agents
+import instrument
 import time
+import random
+import collections
 
 DIRECTIONS = {
     "N": (0, -1),
@@ -21,14 +22,34 @@ VALID_COMMANDS = [
 
 POINTS_PER_GOAL = 100
 
+# compact summary of a finished headless simulation, including how long the agent
+# spent deciding (in seconds) and the turn it ran out of time on, if it did
+SimResult = collections.namedtuple(
+    "SimResult",
+    ["turns", "score", "state", "goals", "think_time", "max_think_time", "timeout_turn"],
+    defaults=[0.0, 0.0, None]
+)
+
 def run_sim(
     the_world, 
     max_turns=None, 
     log=None, 
     use_display=False,
     display_speed=0.5,
-    index=-1 # added for threading
+    index=-1, # added for threading
+    headless=False,
+    seed=None,
+    agent=None,
+    turn_budget=None,
+    episode_budget=None,
+    profile=None, # an instrument.RunProfile to add this run's timings and counters to
+    trace=None, # a tracefile.TraceWriter to record every turn to
+    exporter=None # a display.FrameExporter to render every turn to offscreen, without pausing
 ):
+    # skip all logging and display work and just return a SimResult
+    if headless:
+        return run_sim_headless(the_world, max_turns, seed, agent, turn_budget, episode_budget, profile, trace)
+
     # added for threading
     if index >= 0:
         start_time = time.localtime()
@@ -36,7 +57,15 @@ def run_sim(
         print(f"{start_time.tm_wday:02}-{start_time.tm_mon:02}-{start_time.tm_year:04} {start_time.tm_hour:02}:{start_time.tm_min:02}:{start_time.tm_sec+start_ns-int(start_ns):02.6f} | simulation {index} started")
     #
 
-    the_ai = ai.AI()
+    the_ai = agents.load_agent(agent)(seed)
+    think_time = 0.0
+    max_think_time = 0.0
+    timeout_turn = None
+
+    # seconds spent in each phase of the turns, and the counters before the run
+    clock = time.perf_counter
+    phases = dict.fromkeys(instrument.PHASES, 0.0)
+    counters_before = instrument.read_counters(the_world, the_ai)
 
     agent_x, agent_y = the_world.get_startxy()
     agent_facing = the_world.get_start_face_dir()
@@ -46,15 +75,22 @@ def run_sim(
     percepts = {}
     ai_state = 'GOOD'
     points = 1000
+    goals = []
 
     disp = None
 
+    # exported frames are rendered as fast as possible instead of at watching speed
+    if exporter is not None:
+        use_display = True
+        display_speed = 0
+
     if use_display:
         import display
         disp = display.Display(
             the_world,
             agent_x,
-            agent_y
+            agent_y,
+            exporter
         )
 
     if use_display:
@@ -68,6 +104,7 @@ def run_sim(
     run = True
     while run:
 
+        phase_start = clock()
         if ai_state != 'GOOD':
             run = False
             write_to_log(
@@ -84,14 +121,32 @@ def run_sim(
                 log,
                 f"-----Turn {turn}-----"
             )
+        phases["log"] += clock() - phase_start
 
         # What does the agent see?
+        phase_start = clock()
         percepts = get_percepts(the_world, agent_x, agent_y, agent_facing)
+        phases["percepts"] += clock() - phase_start
 
         # Get agent's command
+        think_start = clock()
         agent_cmd = the_ai.update(percepts)
+        turn_time = clock() - think_start
+        think_time += turn_time
+        max_think_time = max(max_think_time, turn_time)
+        phases["update"] += turn_time
+
+        if agents.exceeds_budget(turn_time, think_time, turn_budget, episode_budget):
+            write_to_log(
+                log,
+                f"Agent exceeded its time budget on turn {turn} ({turn_time:.6f} s, {think_time:.6f} s total)"
+            )
+            ai_state = 'TIMEOUT'
+            timeout_turn = turn
+            continue
 
         # LOG ###############################################################
+        phase_start = clock()
         write_to_log(
             log,
             f"Turn: {turn}"
@@ -111,9 +166,12 @@ def run_sim(
             log,
             f"   Command:  {agent_cmd}"
         )
+        phases["log"] += clock() - phase_start
         # ####################################################################
 
-        # Move the agent
+        # Move the agent (the trigger messages count as part of the move)
+        phase_start = clock()
+        trigger = None
         if validate_agent_cmd(agent_cmd):
 
             new_agent_x = agent_x
@@ -163,6 +221,7 @@ def run_sim(
                     #     run = False
                     # else:
                     points += POINTS_PER_GOAL
+                    goals.append(trigger[2])
                     write_to_log(
                         log,
                         f"   Trigger:  Agent activated goal {trigger[2]}"
@@ -180,11 +239,17 @@ def run_sim(
             write_to_log(log, f"Invalid command: {agent_cmd}")
             ai_state = 'BAD'
             run = False
+        phases["move"] += clock() - phase_start
+
+        if trace is not None:
+            trace.record(turn, agent_x, agent_y, agent_cmd, trigger, points)
 
         if use_display:
+            phase_start = clock()
             disp.update(
                 agent_x, agent_y, agent_facing
             )
+            phases["display"] += clock() - phase_start
             time.sleep(display_speed)
 
 
@@ -205,10 +270,23 @@ def run_sim(
         f"FINAL SCORE: {points}"
     )
 
+    if trace is not None:
+        trace.end(turn-1, agent_x, agent_y, ai_state, points)
+
     if use_display:
-        time.sleep(3)
+        if exporter is None:
+            time.sleep(3)
         disp.quit()
 
+    run_profile = None
+    if profile is not None:
+        counters = instrument.read_counters(the_world, the_ai)
+        for name, count in counters_before.items():
+            counters[name] -= count
+        run_profile = instrument.RunProfile()
+        run_profile.add_run(turn-1, phases, counters)
+        profile.merge(run_profile)
+
     # added for threading
     if index >= 0:
         end_time = time.localtime()
@@ -216,18 +294,111 @@ def run_sim(
         print(f"{end_time.tm_wday:02}-{end_time.tm_mon:02}-{end_time.tm_year:04} {end_time.tm_hour:02}:{end_time.tm_min:02}:{end_time.tm_sec+end_ns-int(end_ns):02.6f} | simulation {index} ended:")
         print(f"{end_time.tm_wday:02}-{end_time.tm_mon:02}-{end_time.tm_year:04} {end_time.tm_hour:02}:{end_time.tm_min:02}:{end_time.tm_sec+end_ns-int(end_ns):02.6f} |     turns: {turn-1}")
         print(f"{end_time.tm_wday:02}-{end_time.tm_mon:02}-{end_time.tm_year:04} {end_time.tm_hour:02}:{end_time.tm_min:02}:{end_time.tm_sec+end_ns-int(end_ns):02.6f} |     runtime: {end_ns-start_ns:02.6f} s")
+        print(f"{end_time.tm_wday:02}-{end_time.tm_mon:02}-{end_time.tm_year:04} {end_time.tm_hour:02}:{end_time.tm_min:02}:{end_time.tm_sec+end_ns-int(end_ns):02.6f} |     think time: {think_time:02.6f} s")
+        if run_profile is not None:
+            for line in run_profile.summary():
+                print(f"{end_time.tm_wday:02}-{end_time.tm_mon:02}-{end_time.tm_year:04} {end_time.tm_hour:02}:{end_time.tm_min:02}:{end_time.tm_sec+end_ns-int(end_ns):02.6f} |     {line}")
     #
 
-    return turn-1
+    return SimResult(turn-1, points, ai_state, goals, think_time, max_think_time, timeout_turn)
+
+def run_sim_headless(the_world, max_turns=None, seed=None, agent=None, turn_budget=None, episode_budget=None, profile=None, trace=None):
+    # same rules as run_sim, minus the per-turn logging, flushing and display checks
+    the_ai = agents.load_agent(agent)(seed)
+    think_time = 0.0
+    max_think_time = 0.0
+    timeout_turn = None
+
+    clock = time.perf_counter
+    percept_time = 0.0
+    move_time = 0.0
+    counters_before = instrument.read_counters(the_world, the_ai)
+
+    agent_x, agent_y = the_world.get_startxy()
+    agent_facing = the_world.get_start_face_dir()
+    turn = 1
+    ai_state = 'GOOD'
+    points = 1000
+    goals = []
+
+    while ai_state == 'GOOD':
+        phase_start = clock()
+        percepts = get_percepts(the_world, agent_x, agent_y, agent_facing)
+        think_start = clock()
+        percept_time += think_start - phase_start
+
+        agent_cmd = the_ai.update(percepts)
+        turn_time = clock() - think_start
+        think_time += turn_time
+        max_think_time = max(max_think_time, turn_time)
+
+        # an agent out of time forfeits the rest of the episode
+        if agents.exceeds_budget(turn_time, think_time, turn_budget, episode_budget):
+            ai_state = 'TIMEOUT'
+            timeout_turn = turn
+            break
+
+        phase_start = clock()
+        trigger = None
+        if validate_agent_cmd(agent_cmd):
+            agent_x, agent_y, trigger = apply_command(the_world, agent_x, agent_y, agent_cmd)
+            match trigger[0]:
+                case "EXIT":
+                    ai_state = 'EXITED'
+                case "GOAL_TRIGGERED":
+                    points += POINTS_PER_GOAL
+                    goals.append(trigger[2])
+        else:
+            ai_state = 'BAD'
+        move_time += clock() - phase_start
+
+        if trace is not None:
+            trace.record(turn, agent_x, agent_y, agent_cmd, trigger, points)
+
+        if max_turns is not None and turn >= max_turns:
+            break
+
+        points -= 1
+        turn += 1
+
+    if profile is not None:
+        counters = instrument.read_counters(the_world, the_ai)
+        for name, count in counters_before.items():
+            counters[name] -= count
+        profile.add_run(turn-1, {"percepts": percept_time, "update": think_time, "move": move_time}, counters)
+
+    if trace is not None:
+        trace.end(turn-1, agent_x, agent_y, ai_state, points)
+
+    return SimResult(turn-1, points, ai_state, goals, think_time, max_think_time, timeout_turn)
+
+def derive_seed(seed, index):
+    # a seed for the index-th run of a batch, stable across processes and platforms
+    return random.Random(f"{seed}:{index}").getrandbits(32)
+
+def apply_command(the_world, agent_x, agent_y, agent_cmd):
+    # move the agent if it can, then resolve whatever it triggered
+    match agent_cmd:
+        case 'N' | 'E' | 'S' | 'W':
+            dx, dy = DIRECTIONS[agent_cmd]
+            if the_world.is_cell_enterable(agent_x + dx, agent_y + dy):
+                agent_x += dx
+                agent_y += dy
+
+    trigger = the_world.check_triggers(agent_x, agent_y, agent_cmd)
+    if trigger[0] == "TELEPORT":
+        agent_x = trigger[1]
+        agent_y = trigger[2]
+
+    return agent_x, agent_y, trigger
 
 def get_percepts(the_world, agent_x, agent_y, agent_facing):
     # percepts = the_world.get_cells_around(agent_x, agent_y)
     percepts = {'X':[the_world.get_cell(agent_x, agent_y)]}
     for d, v in DIRECTIONS.items():
         dx, dy = v
-        ray = the_world.raycast(agent_x, agent_y, dx, dy)
-        ray = the_world.prune_raycast(ray)
-        percepts[d] = ray
+        # agents get lists of their own to do what they like with, as they always have
+        percepts[d] = list(the_world.get_visible_cells(agent_x, agent_y, dx, dy))
 
     # percepts = [the_world.get_cell(agent_x, agent_y)]
     # dx, dy = DIRECTIONS[agent_facing]
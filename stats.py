@@ -0,0 +1,182 @@
+import math
+import instrument
+
+# Streaming summaries of batch results. Each one takes values one at a time in
+# constant memory, and two of the same kind can be merged, so workers can
+# summarize their own share of a batch and the totals still come out right.
+
+class RunningStats:
+    # count, mean and variance with Welford's algorithm, plus the extremes
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        if other.count == 0:
+            return
+        if self.count == 0:
+            self.count, self.mean, self.m2 = other.count, other.mean, other.m2
+            self.min, self.max = other.min, other.max
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def variance(self):
+        if self.count < 2:
+            return 0.0
+        return self.m2 / (self.count - 1)
+
+    def stddev(self):
+        return math.sqrt(self.variance())
+
+
+class QuantileSketch:
+    # quantiles to within a relative error, from counts in logarithmically sized
+    # buckets. the number of buckets only grows with log(max / min), not with the
+    # number of values
+
+    def __init__(self, relative_accuracy=0.01):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.buckets = {}
+        self.zeros = 0 # values too small for a logarithmic bucket
+        self.count = 0
+
+    def add(self, value):
+        self.count += 1
+        if value <= 0:
+            self.zeros += 1
+            return
+        key = math.ceil(math.log(value) / self.log_gamma)
+        self.buckets[key] = self.buckets.get(key, 0) + 1
+
+    def merge(self, other):
+        self.count += other.count
+        self.zeros += other.zeros
+        for key, count in other.buckets.items():
+            self.buckets[key] = self.buckets.get(key, 0) + count
+
+    def quantile(self, q):
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zeros
+        if rank < seen:
+            return 0.0
+        for key in sorted(self.buckets):
+            seen += self.buckets[key]
+            if rank < seen:
+                # the middle of the bucket, which is within relative_accuracy of anything in it
+                return 2 * self.gamma ** key / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.buckets) / (self.gamma + 1)
+
+
+class Histogram:
+    # counts of values in fixed-width bins, created as values arrive
+
+    def __init__(self, bin_width=1):
+        self.bin_width = bin_width
+        self.bins = {}
+
+    def add(self, value):
+        key = int(value // self.bin_width)
+        self.bins[key] = self.bins.get(key, 0) + 1
+
+    def merge(self, other):
+        for key, count in other.bins.items():
+            self.bins[key] = self.bins.get(key, 0) + count
+
+    def edges_and_counts(self):
+        # left edge and count of every bin from the lowest to the highest, empty ones included
+        if not self.bins:
+            return [], []
+        keys = range(min(self.bins), max(self.bins) + 1)
+        return [key * self.bin_width for key in keys], [self.bins.get(key, 0) for key in keys]
+
+
+class TurnStats:
+    # everything batch.py reports about the turn counts of a batch
+
+    def __init__(self, bin_width=20):
+        self.running = RunningStats()
+        self.sketch = QuantileSketch()
+        self.histogram = Histogram(bin_width)
+        self.slowest = None # index of the run that took the most turns
+
+        # how fast the agent decided, when the runs report it (in seconds)
+        self.think = RunningStats()     # mean time per turn of each run
+        self.max_think = RunningStats() # slowest turn of each run
+        self.timeouts = 0
+
+        # where the runs spent their time, when they were profiled
+        self.profile = None
+
+    def add(self, turns, index):
+        if self.running.max is None or turns > self.running.max:
+            self.slowest = index
+        self.running.add(turns)
+        self.sketch.add(turns)
+        self.histogram.add(turns)
+
+    def add_result(self, result, index):
+        # a sim.SimResult, which also carries the agent's timings
+        self.add(result.turns, index)
+        self.think.add(result.think_time / max(1, result.turns))
+        self.max_think.add(result.max_think_time)
+        if result.timeout_turn is not None:
+            self.timeouts += 1
+
+    def add_profile(self, profile):
+        if self.profile is None:
+            self.profile = instrument.RunProfile()
+        self.profile.merge(profile)
+
+    def merge(self, other):
+        if other.running.count and (self.running.max is None or other.running.max > self.running.max):
+            self.slowest = other.slowest
+        self.running.merge(other.running)
+        self.sketch.merge(other.sketch)
+        self.histogram.merge(other.histogram)
+        self.think.merge(other.think)
+        self.max_think.merge(other.max_think)
+        self.timeouts += other.timeouts
+        if other.profile is not None:
+            self.add_profile(other.profile)
+
+    def summary(self):
+        lines = [
+            f"Min turn count: {self.running.min}",
+            f"Q1 turn count: {self.sketch.quantile(0.25):.0f}",
+            f"Median turn count: {self.sketch.quantile(0.5):.0f}",
+            f"Q3 turn count: {self.sketch.quantile(0.75):.0f}",
+            f"Max turn count: {self.running.max}",
+            f"Mean turn count: {self.running.mean:.2f}",
+            f"Std dev turn count: {self.running.stddev():.2f}"
+        ] + ([
+            f"Mean think time per turn: {self.think.mean*1e6:.2f} us",
+            f"Slowest turn: {self.max_think.max*1e6:.2f} us",
+            f"Runs over the time budget: {self.timeouts}"
+        ] if self.think.count else [])
+        if self.profile is not None:
+            lines += self.profile.summary()
+        return lines
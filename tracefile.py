@@ -0,0 +1,109 @@
+import struct
+import json
+import collections
+import misc
+
+# A compact binary record of a simulation, one file per run. The file starts
+# with a small JSON header describing the run, followed by one fixed-size record
+# per turn and a final END record holding how the run finished:
+#
+#   b"MWTR" | version (u8) | header length (u32) | header (JSON)
+#   turn (u32) | x (i32) | y (i32) | command | trigger (u8) | goal | score (i32)
+#   ...
+#
+# x and y are where the agent ended the turn, command is '?' when the agent
+# returned something invalid, goal is the goal cell it triggered (or a NUL byte),
+# and score is the score after the turn's triggers. Records are built up in
+# memory and written out in large blocks instead of a syscall per line.
+
+MAGIC = b"MWTR"
+VERSION = 1
+PREAMBLE = struct.Struct("<4sBI")
+RECORD = struct.Struct("<IiicBci")
+
+# trigger codes, in the order they are stored
+TRIGGERS = ["NONE", "EXIT", "TELEPORT", "DOORS_OPEN", "GOAL_TRIGGERED", "END"]
+TRIGGER_CODES = {trigger: code for code, trigger in enumerate(TRIGGERS)}
+
+# final agent states, stored in the goal byte of the END record
+STATES = ['GOOD', 'EXITED', 'BAD', 'TIMEOUT']
+
+# bytes of records kept in memory before they are written out
+BUFFER_SIZE = 64 * 1024
+
+TraceRecord = collections.namedtuple("TraceRecord", ["turn", "x", "y", "cmd", "trigger", "goal", "score"])
+
+class TraceWriter:
+    def __init__(self, filename, the_world, seed=None, agent=None):
+        self.filename = filename
+        self.buffer = bytearray()
+        header = json.dumps({
+            "world": the_world.world_filename,
+            "size": [the_world.get_width(), the_world.get_height()],
+            "start": list(the_world.get_startxy()),
+            "facing": the_world.get_start_face_dir(),
+            "seed": seed,
+            "agent": agent
+        }).encode()
+        self.file = open(filename, 'wb')
+        self.file.write(PREAMBLE.pack(MAGIC, VERSION, len(header)))
+        self.file.write(header)
+
+    def record(self, turn, x, y, cmd, trigger, score):
+        # trigger is whatever World.check_triggers returned, or None for an invalid command
+        if trigger is None:
+            cmd = '?'
+            trigger = ["NONE"]
+        goal = trigger[2].encode() if trigger[0] == "GOAL_TRIGGERED" else b"\0"
+        self.buffer += RECORD.pack(turn, x, y, cmd.encode(), TRIGGER_CODES[trigger[0]], goal, score)
+        if len(self.buffer) >= BUFFER_SIZE:
+            self.flush()
+
+    def end(self, turns, x, y, state, score):
+        self.buffer += RECORD.pack(turns, x, y, b"\0", TRIGGER_CODES["END"], bytes([STATES.index(state)]), score)
+        self.flush()
+
+    def flush(self):
+        self.file.write(self.buffer)
+        self.buffer.clear()
+
+    def close(self):
+        if not self.file.closed:
+            self.flush()
+            self.file.close()
+
+class TraceReader:
+    def __init__(self, filename):
+        self.filename = filename
+        with open(filename, 'rb') as f:
+            data = f.read()
+
+        if len(data) < PREAMBLE.size:
+            raise misc.InvalidTraceException(f"{filename} is too short to be a trace")
+        magic, version, length = PREAMBLE.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise misc.InvalidTraceException(f"{filename} is not a version {VERSION} trace")
+        self.header = json.loads(data[PREAMBLE.size:PREAMBLE.size + length])
+
+        # a run cut short (e.g. by a crash) has no END record, and may end mid-record
+        body = data[PREAMBLE.size + length:]
+        body = body[:len(body) - len(body) % RECORD.size]
+
+        self.records = []
+        self.final = None
+        for turn, x, y, cmd, trigger, goal, score in RECORD.iter_unpack(body):
+            if trigger == TRIGGER_CODES["END"]:
+                self.final = TraceRecord(turn, x, y, None, "END", STATES[goal[0]], score)
+                break
+            self.records.append(TraceRecord(
+                turn, x, y, cmd.decode(), TRIGGERS[trigger],
+                goal.decode() if goal != b"\0" else None, score
+            ))
+
+    def commands(self):
+        return [record.cmd for record in self.records]
+
+    def columns(self):
+        # the records as one list per field, for analysis
+        fields = zip(*self.records) if self.records else [[] for field in TraceRecord._fields]
+        return {name: list(values) for name, values in zip(TraceRecord._fields, fields)}
@@ -1,5 +1,22 @@
+import os
+import mmap
+import struct
+import hashlib
+import collections
 import misc
 
+# where parsed worlds are cached, keyed by a hash of the file's contents
+WORLD_CACHE_DIR = os.environ.get("MICROWORLD_CACHE", ".worldcache")
+
+# magic, version, start x and y, facing, width and height of a cached world, followed by its grid
+CACHE_HEADER = struct.Struct("<4sBiicII")
+CACHE_MAGIC = b"MWWC"
+CACHE_VERSION = 1
+
+# the same for a ChunkedWorld's chunk file, plus the chunk size, followed by its chunks
+CHUNK_HEADER = struct.Struct("<4sBiicIII")
+CHUNK_MAGIC = b"MWCK"
+
 class World:
 
     VALID_CELLS = [
@@ -10,14 +27,27 @@ class World:
         '0'
     ]
 
+    # The same, for quick membership checks
+    VALID_CELL_SET = frozenset(VALID_CELLS)
+
     # Cells that are treated as walls.
     WALL_CELLS = ['w']
 
     # Goal Cells
     GOAL_CELLS = ['0', '1', '2', '3', '4', '5', '6', '7', '8', '9']
+    GOAL_CELL_SET = frozenset(GOAL_CELLS)
 
     DIRECTIONS = ['N', 'E', 'S', 'W']
 
+    # Which staircase each staircase teleports to
+    STAIR_PARTNERS = {'b': 'o', 'o': 'b', 'y': 'p', 'p': 'y'}
+
+    # Cells tracked by the location index (everything but floors and walls)
+    INDEXED_CELLS = set(VALID_CELLS) - {'g'} - set(WALL_CELLS)
+
+    # Unit steps for the rays in the visibility index
+    RAY_STEPS = [(0, -1), (1, 0), (0, 1), (-1, 0)]
+
     def __init__(self, world_filename):
         self.world_filename = world_filename
         self.start_x = None
@@ -28,68 +58,111 @@ class World:
         self.world_map = []
         self.doors_closed = True
         self.goals = []
+        # wall-pruned rays keyed by (x, y, dx, dy), filled in as they are first looked up
+        self.visibility = {}
+        self.rays_cast = 0 # rays actually cast, i.e. visibility lookups that missed
+        # coordinates of every cell of each indexed type, e.g. {'b': {(3, 4)}, ...}
+        self.cell_index = {}
+        # cells changed since the last take_changes, or None when nobody is tracking them
+        self.changes = None
 
-    def load_world(self):
-        try:
-            with open(self.world_filename, 'r') as f:
-
-                # Parse agent starting location
-                startxy = f.readline().strip().split()
-                facedir = f.readline().strip()
-                
-                if len(startxy) != 2:
-                    raise misc.InvalidWorldException(
-                        f"World {self.world_filename} is missing the xy agent start."
-                    )
-
-                if facedir in World.DIRECTIONS:
-                    self.face_dir = facedir
-                else:
-                    raise misc.InvalidWorldException(
-                        f"World {self.world_filename} has an invalid starting facing."
-                    )
-
-                try:
-                    self.start_x = int(startxy[0])
-                    self.start_y = int(startxy[1])
-                except Exception:
-                    raise misc.InvalidWorldException(
-                        f"Invalid agent starting cell: {startxy[0]} {startxy[1]}"
-                    )
-
-                # Parse the world
-                for line in f:
-                    line = line.split()
-                    row = []
-                    for element in line:
-                        if element not in World.VALID_CELLS:
-                            raise misc.InvalidCellException(
-                                f"{element} is not a valid cell type."
-                            )
-                        row.append(element)
-                    self.world_map.append(row)
-
-                self.height = len(self.world_map)
-                self.width = len(self.world_map[0])
-
-                # Find all the goals
-                self.find_goals()
+        # The map itself never changes once loaded, so any number of episodes
+        # (see new_episode) can share it. What a simulation changes lives here:
+        self.overlay = {}         # changed cells, e.g. {(4, 7): 'g'}
+        self.ray_overrides = {}   # rays that reach a changed cell, or None until they are cast again
+        self.owned_index = set()  # cell types whose cell_index set is this world's own to change
+        self.parent = None        # the world this episode was made from
 
+    def load_world(self, use_cache=True):
+        try:
+            with open(self.world_filename, 'rb') as f:
+                data = f.read()
         except FileNotFoundError:
             print(f"{self.world_filename} was not found.")
+            return
+
+        # a file that has been parsed before is read back from the cache instead
+        key = hashlib.sha256(data).hexdigest()
+        parsed = read_cached_world(key) if use_cache else None
+        if parsed is None:
+            parsed = parse_world(data.decode(), self.world_filename)
+            if use_cache:
+                write_cached_world(key, parsed)
+
+        self.start_x, self.start_y, self.face_dir, width, height, grid = parsed
+        self.store_grid(grid, width, height)
+        self.build_index()
+
+        # Find all the goals
+        self.find_goals()
+
+        # nothing else shares the index yet, so it can be changed in place
+        self.owned_index = set(World.INDEXED_CELLS)
+
+    def new_episode(self):
+        # a world that shares this one's map and visibility cache, with its own
+        # copy of everything a simulation changes. nothing is copied until it is changed
+        episode = object.__new__(type(self))
+        episode.__dict__.update(self.__dict__)
+        episode.parent = self
+        episode.reset()
+        return episode
+
+    def reset(self):
+        # put an episode back the way its parent is, in time proportional to
+        # what the parent has changed rather than to the size of the map
+        parent = self.parent
+        self.overlay = dict(parent.overlay)
+        self.ray_overrides = dict(parent.ray_overrides)
+        self.goals = list(parent.goals)
+        self.cell_index = parent.cell_index
+        self.owned_index = set()
+        parent.owned_index = set()
+        self.changes = None
+
+    def own_index(self, cell):
+        # the cell_index set of a cell type, copied first if it is still shared
+        if cell not in self.owned_index:
+            if not self.owned_index:
+                self.cell_index = dict(self.cell_index)
+            self.cell_index[cell] = set(self.cell_index[cell])
+            self.owned_index.add(cell)
+        return self.cell_index[cell]
+
+    def store_grid(self, grid, width, height):
+        # the map as row-major bytes of cell codes, which is how parse_world and the cache hand it over
+        self.store_map([list(grid[y*width:(y+1)*width].decode('ascii')) for y in range(height)])
+
+    def store_map(self, rows):
+        self.world_map = rows
+        self.height = len(self.world_map)
+        self.width = len(self.world_map[0])
+
+    def map_bytes(self):
+        # the loaded map (without the overlay) as row-major bytes of cell codes, like store_grid takes
+        return "".join("".join(row) for row in self.world_map).encode('ascii')
+
+    def build_index(self):
+        self.cell_index = {cell: set() for cell in World.INDEXED_CELLS}
+        for y, row in enumerate(self.world_map):
+            # most rows are only floors and walls, which one set check skips
+            if World.INDEXED_CELLS.isdisjoint(row):
+                continue
+            for x, cell in enumerate(row):
+                if cell in self.cell_index:
+                    self.cell_index[cell].add((x, y))
 
     def prettyprint_world(self):
-        for row in self.world_map:
-            for ele in row:
-                print(f"{ele} ",end="")
+        for y in range(self.height):
+            for x in range(self.width):
+                print(f"{self.get_cell(x, y)} ",end="")
             print()
 
 
     def find_goals(self):
         for row in self.world_map:
-            for ele in row:
-                if ele in World.GOAL_CELLS:
-                    self.goals.append(ele)
+            if not World.GOAL_CELL_SET.isdisjoint(row):
+                self.goals.extend(cell for cell in row if cell in World.GOAL_CELL_SET)
         self.goals.sort()
 
     def get_width(self):
@@ -105,17 +178,41 @@ class World:
         return self.face_dir
 
     def get_cell(self, x, y):
+        if self.overlay:
+            cell = self.overlay.get((x, y))
+            if cell is not None:
+                return cell
         return self.world_map[y][x]
     
     def set_cell(self, x, y, flag):
-        self.world_map[y][x] = flag
+        old = self.get_cell(x, y)
+        self.put_cell(x, y, flag)
+        if old in self.cell_index:
+            self.own_index(old).discard((x, y))
+        if flag in self.cell_index:
+            self.own_index(flag).add((x, y))
+        self.invalidate_visibility(x, y)
+        if self.changes is not None:
+            self.changes.append((x, y))
+
+    def track_changes(self):
+        # start logging changed cells, e.g. for a display that only redraws those
+        if self.changes is None:
+            self.changes = []
+
+    def take_changes(self):
+        changes = self.changes or []
+        if self.changes is not None:
+            self.changes = []
+        return changes
+
+    def put_cell(self, x, y, flag):
+        # raw write into the overlay, without any of set_cell's bookkeeping
+        self.overlay[(x, y)] = flag
 
     def is_valid_cell(self, x, y):
-        try:
-            self.world_map[y][x]
-            return True
-        except IndexError:
-            return False
+        # bounds check explicitly, since negative indexes would wrap around the map
+        return 0 <= y < len(self.world_map) and 0 <= x < len(self.world_map[y])
 
     def is_cell_enterable(self, x, y):
         if self.is_valid_cell(x, y):
@@ -150,20 +247,78 @@ class World:
     def prune_raycast(self, cells):
         for i in range(len(cells)):
             if cells[i] in World.WALL_CELLS:
-                break
-        return cells[:i+1]
+                return cells[:i+1]
+        return cells
+
+    def get_visible_cells(self, x, y, dx, dy):
+        # the wall-pruned ray from (x, y), cast only the first time it is asked for. rays are
+        # shared by every caller and every episode, so they are kept as tuples nobody can change
+        key = (x, y, dx, dy)
+        if self.ray_overrides and key in self.ray_overrides:
+            ray = self.ray_overrides[key]
+            if ray is None:
+                ray = tuple(self.prune_raycast(self.raycast(x, y, dx, dy)))
+                self.ray_overrides[key] = ray
+                self.rays_cast += 1
+            return ray
+
+        # every other ray only passes unchanged cells, so it is the same for every episode
+        ray = self.visibility.get(key)
+        if ray is None:
+            ray = tuple(self.prune_raycast(self.raycast(x, y, dx, dy)))
+            self.visibility[key] = ray
+            self.rays_cast += 1
+        return ray
+
+    def build_visibility(self):
+        # precompute the whole index up front instead of lazily
+        for y in range(self.height):
+            for x in range(self.width):
+                for dx, dy in World.RAY_STEPS:
+                    self.get_visible_cells(x, y, dx, dy)
+
+    def invalidate_visibility(self, x, y):
+        # walk back from (x, y) in each direction, overriding every shared ray that
+        # reaches it with one of this world's own, cast again when next looked up
+        for dx, dy in World.RAY_STEPS:
+            ox = x - dx
+            oy = y - dy
+            while 0 <= ox < self.width and 0 <= oy < self.height:
+                self.ray_overrides[(ox, oy, dx, dy)] = None
+                # rays starting further back stop at this wall before they get to (x, y)
+                if self.get_cell(ox, oy) in World.WALL_CELLS:
+                    break
+                ox -= dx
+                oy -= dy
 
     def find_cell(self, flag):
-        for y in range(len(self.world_map)):
-            for x in range(len(self.world_map[y])):
+        # indexed cells are a lookup, anything else needs a scan of the map
+        if flag in self.cell_index:
+            positions = self.cell_index[flag]
+            if not positions:
+                return None
+            # the first one in reading order, same as the scan would find
+            return min(positions, key=lambda p: (p[1], p[0]))
+        return self.scan_for_cell(flag)
+
+    def scan_for_cell(self, flag):
+        for y in range(self.height):
+            for x in range(self.width):
                 cell = self.get_cell(x, y)
                 if cell == flag:
                     return (x, y)
         return None
 
     def swap_all_cells(self, flagA, flagB):
-        for y in range(len(self.world_map)):
-            for x in range(len(self.world_map[y])):
+        if flagA in self.cell_index:
+            for x, y in list(self.cell_index[flagA]):
+                self.set_cell(x, y, flagB)
+        else:
+            self.scan_swap_cells(flagA, flagB)
+
+    def scan_swap_cells(self, flagA, flagB):
+        for y in range(self.height):
+            for x in range(self.width):
                 cell = self.get_cell(x, y)
                 if cell == flagA:
                     self.set_cell(x, y, flagB)
@@ -174,20 +329,8 @@ class World:
             
             if cell == "r" and cmd == "U":
                 return ["EXIT"]
-            elif cell == "b" and cmd == "U":
-                nxny = self.find_cell("o")
-                if nxny is not None:
-                    return ["TELEPORT", nxny[0], nxny[1]]
-            elif cell == "o" and cmd == "U":
-                nxny = self.find_cell("b")
-                if nxny is not None:
-                    return ["TELEPORT", nxny[0], nxny[1]]
-            elif cell == "y" and cmd == "U":
-                nxny = self.find_cell("p")
-                if nxny is not None:
-                    return ["TELEPORT", nxny[0], nxny[1]]
-            elif cell == "p" and cmd == "U":
-                nxny = self.find_cell("y")
+            elif cell in World.STAIR_PARTNERS and cmd == "U":
+                nxny = self.find_cell(World.STAIR_PARTNERS[cell])
                 if nxny is not None:
                     return ["TELEPORT", nxny[0], nxny[1]]
             elif cell in World.GOAL_CELLS and cmd == "U":
@@ -197,3 +340,389 @@ class World:
                 return ["GOAL_TRIGGERED", len(self.goals), cell]
                 
         return ["NONE"]
+
+
+
+def parse_world(text, world_filename):
+    # the start, facing and map of a world file, with the map as row-major bytes of cell codes
+    lines = text.splitlines()
+    if len(lines) < 2:
+        raise misc.InvalidWorldException(
+            f"World {world_filename} is missing the xy agent start."
+        )
+
+    # Parse agent starting location
+    startxy = lines[0].strip().split()
+    facedir = lines[1].strip()
+
+    if len(startxy) != 2:
+        raise misc.InvalidWorldException(
+            f"World {world_filename} is missing the xy agent start."
+        )
+
+    if facedir not in World.DIRECTIONS:
+        raise misc.InvalidWorldException(
+            f"World {world_filename} has an invalid starting facing."
+        )
+
+    try:
+        start_x = int(startxy[0])
+        start_y = int(startxy[1])
+    except Exception:
+        raise misc.InvalidWorldException(
+            f"Invalid agent starting cell: {startxy[0]} {startxy[1]}"
+        )
+
+    # Parse the world, a whole row at a time
+    grid = bytearray()
+    width = None
+    height = 0
+    for line in lines[2:]:
+        row = line.split()
+        if not row:
+            continue
+        if not World.VALID_CELL_SET.issuperset(row):
+            element = next(element for element in row if element not in World.VALID_CELL_SET)
+            raise misc.InvalidCellException(
+                f"{element} is not a valid cell type."
+            )
+        if width is None:
+            width = len(row)
+        elif len(row) != width:
+            raise misc.InvalidWorldException(
+                f"World {world_filename} has {len(row)} cells in row {height}, but {width} in row 0."
+            )
+        grid += ''.join(row).encode('ascii')
+        height += 1
+
+    if height == 0:
+        raise misc.InvalidWorldException(
+            f"World {world_filename} has no map."
+        )
+
+    return start_x, start_y, facedir, width, height, bytes(grid)
+
+def read_cached_world(key):
+    # the parse_world result cached under key, or None if there isn't a usable one
+    try:
+        with open(os.path.join(WORLD_CACHE_DIR, key), 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+    if len(data) < CACHE_HEADER.size:
+        return None
+    magic, version, start_x, start_y, facedir, width, height = CACHE_HEADER.unpack_from(data)
+    grid = data[CACHE_HEADER.size:]
+    if magic != CACHE_MAGIC or version != CACHE_VERSION or len(grid) != width*height:
+        return None
+    return start_x, start_y, facedir.decode('ascii'), width, height, grid
+
+def write_cached_world(key, parsed):
+    start_x, start_y, facedir, width, height, grid = parsed
+    path = os.path.join(WORLD_CACHE_DIR, key)
+    # write to a temporary file first, so processes loading at the same time never see half a file
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(WORLD_CACHE_DIR, exist_ok=True)
+        with open(temp_path, 'wb') as f:
+            f.write(CACHE_HEADER.pack(CACHE_MAGIC, CACHE_VERSION, start_x, start_y, facedir.encode('ascii'), width, height))
+            f.write(grid)
+        os.replace(temp_path, path)
+    except OSError:
+        # the cache is only an optimization, so a read-only disk just means no caching
+        pass
+
+
+
+# A World whose map is one row-major bytearray of cell codes instead of a list
+# of lists of strings. get_cell/set_cell behave the same, but scans run as
+# bytearray operations and a copy of the world costs one byte per cell.
+class CompactWorld(World):
+
+    # Byte stored in the grid for each cell type
+    CELL_CODES = {cell: ord(cell) for cell in World.VALID_CELLS}
+
+    def __init__(self, world_filename):
+        super().__init__(world_filename)
+        self.grid = bytearray()
+
+    def store_map(self, rows):
+        self.height = len(rows)
+        self.width = len(rows[0])
+        self.grid = bytearray(
+            CompactWorld.CELL_CODES[cell] for row in rows for cell in row
+        )
+
+    def store_grid(self, grid, width, height):
+        # already in the right layout, since the codes are the cells' ASCII values
+        self.width = width
+        self.height = height
+        self.grid = bytearray(grid)
+
+    def map_bytes(self):
+        return bytes(self.grid)
+
+    def find_goals(self):
+        for cell in World.GOAL_CELLS:
+            self.goals.extend(cell for i in range(self.grid.count(CompactWorld.CELL_CODES[cell])))
+        self.goals.sort()
+
+    def get_cell(self, x, y):
+        if self.overlay:
+            cell = self.overlay.get((x, y))
+            if cell is not None:
+                return cell
+        return chr(self.grid[y*self.width + x])
+
+    def is_valid_cell(self, x, y):
+        return 0 <= x < self.width and 0 <= y < self.height
+
+    def raycast(self, x, y, dx, dy):
+        # the grid doesn't know about the overlay, so rays through changed cells go cell by cell
+        if self.overlay:
+            return super().raycast(x, y, dx, dy)
+
+        # slice the whole ray out of the grid at once
+        i = y*self.width + x
+        if dx > 0:
+            cells = self.grid[i+1:(y+1)*self.width]
+        elif dx < 0:
+            cells = self.grid[y*self.width:i][::-1]
+        elif dy > 0:
+            cells = self.grid[i+self.width::self.width]
+        elif y > 0:
+            cells = self.grid[i-self.width::-self.width]
+        else:
+            cells = bytearray()
+        return list(cells.decode('ascii'))
+
+    def build_index(self):
+        self.cell_index = {cell: set() for cell in World.INDEXED_CELLS}
+        for cell in World.INDEXED_CELLS:
+            for i in self.find_all_cells(cell):
+                self.cell_index[cell].add((i % self.width, i // self.width))
+
+    def scan_for_cell(self, flag):
+        if self.overlay:
+            return super().scan_for_cell(flag)
+        i = self.grid.find(CompactWorld.CELL_CODES[flag])
+        if i < 0:
+            return None
+        return (i % self.width, i // self.width)
+
+    def find_all_cells(self, flag):
+        code = CompactWorld.CELL_CODES[flag]
+        positions = []
+        i = self.grid.find(code)
+        while i >= 0:
+            positions.append(i)
+            i = self.grid.find(code, i+1)
+        return positions
+
+    def scan_swap_cells(self, flagA, flagB):
+        # the grid is shared, so find flagA in it and in the overlay, skipping cells already changed away
+        positions = [
+            (i % self.width, i // self.width) for i in self.find_all_cells(flagA)
+            if (i % self.width, i // self.width) not in self.overlay
+        ]
+        positions.extend(position for position, cell in self.overlay.items() if cell == flagA)
+        for x, y in positions:
+            self.set_cell(x, y, flagB)
+
+
+
+# A World for maps too big to hold as objects. The grid lives in a binary file
+# in the world cache, split into square chunks, which is memory-mapped read-only
+# and shared through the page cache by every process using it. Chunks are copied
+# out of the map only when a cell in them is read, and at most max_resident of
+# them are kept, least recently used first out. Changes (e.g. triggered goals)
+# never touch the file; like every World's, they go into the overlay.
+class ChunkedWorld(World):
+
+    # Width and height of a chunk, in cells
+    CHUNK_SIZE = 64
+
+    # Chunks kept in memory at once, by default
+    MAX_RESIDENT_CHUNKS = 64
+
+    def __init__(self, world_filename, max_resident=None):
+        super().__init__(world_filename)
+        self.chunk_filename = None
+        self.chunks_w = 0
+        self.chunks_h = 0
+        self.max_resident = max_resident or ChunkedWorld.MAX_RESIDENT_CHUNKS
+        self.map = None # opened on first use, separately in every process
+        self.resident = collections.OrderedDict()
+        self.last_chunk_id = None
+        self.last_chunk = None
+        self.chunk_loads = 0 # chunks copied in from the map, including reloads after eviction
+
+    def load_world(self, use_cache=True):
+        try:
+            with open(self.world_filename, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            print(f"{self.world_filename} was not found.")
+            return
+
+        # the chunk file is the storage, so it is always written, but only rebuilt when asked to be
+        key = hashlib.sha256(data).hexdigest()
+        self.chunk_filename = os.path.join(WORLD_CACHE_DIR, f"{key}.chunks")
+        header = read_chunk_header(self.chunk_filename) if use_cache else None
+        if header is None:
+            parsed = read_cached_world(key) if use_cache else None
+            if parsed is None:
+                parsed = parse_world(data.decode(), self.world_filename)
+            write_chunk_file(self.chunk_filename, parsed, ChunkedWorld.CHUNK_SIZE)
+            header = read_chunk_header(self.chunk_filename)
+            if header is None:
+                raise misc.InvalidWorldException(f"Could not write the chunk file for {self.world_filename}.")
+        del data
+
+        self.start_x, self.start_y, self.face_dir, self.width, self.height = header
+        self.chunks_w = -(-self.width // ChunkedWorld.CHUNK_SIZE)
+        self.chunks_h = -(-self.height // ChunkedWorld.CHUNK_SIZE)
+        self.build_index()
+
+        # Find all the goals
+        self.find_goals()
+
+        # nothing else shares the index yet, so it can be changed in place
+        self.owned_index = set(World.INDEXED_CELLS)
+
+    def open_map(self):
+        with open(self.chunk_filename, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def map_bytes(self):
+        # straight from the mapped file, a chunk-wide slice at a time, without making chunks resident
+        if self.map is None:
+            self.open_map()
+        size = ChunkedWorld.CHUNK_SIZE
+        rows = []
+        for y in range(self.height):
+            start = CHUNK_HEADER.size + ((y // size)*self.chunks_w*size + y % size)*size
+            row = b"".join(self.map[start + cx*size*size:start + cx*size*size + size] for cx in range(self.chunks_w))
+            rows.append(row[:self.width])
+        return b"".join(rows)
+
+    def chunk(self, chunk_id):
+        # the cells of one chunk, loading it if it isn't resident
+        if chunk_id == self.last_chunk_id:
+            return self.last_chunk
+        chunk = self.resident.get(chunk_id)
+        if chunk is None:
+            if self.map is None:
+                self.open_map()
+            size = ChunkedWorld.CHUNK_SIZE * ChunkedWorld.CHUNK_SIZE
+            start = CHUNK_HEADER.size + chunk_id*size
+            chunk = self.map[start:start + size]
+            self.chunk_loads += 1
+            self.resident[chunk_id] = chunk
+            if len(self.resident) > self.max_resident:
+                self.resident.popitem(last=False)
+        else:
+            self.resident.move_to_end(chunk_id)
+        self.last_chunk_id = chunk_id
+        self.last_chunk = chunk
+        return chunk
+
+    def get_cell(self, x, y):
+        if self.overlay:
+            cell = self.overlay.get((x, y))
+            if cell is not None:
+                return cell
+        size = ChunkedWorld.CHUNK_SIZE
+        chunk = self.chunk((y // size)*self.chunks_w + x // size)
+        return chr(chunk[(y % size)*size + x % size])
+
+    def is_valid_cell(self, x, y):
+        return 0 <= x < self.width and 0 <= y < self.height
+
+    def raycast(self, x, y, dx, dy):
+        # stop at the first wall, which is all prune_raycast keeps anyway, so
+        # a ray never pulls in chunks beyond what the agent could see
+        cells = []
+        nx = x+dx
+        ny = y+dy
+        while 0 <= nx < self.width and 0 <= ny < self.height:
+            cell = self.get_cell(nx, ny)
+            cells.append(cell)
+            if cell in World.WALL_CELLS:
+                break
+            nx = nx+dx
+            ny = ny+dy
+        return cells
+
+    def build_index(self):
+        # search the mapped file directly, without making any chunk resident
+        if self.map is None:
+            self.open_map()
+        size = ChunkedWorld.CHUNK_SIZE
+        self.cell_index = {cell: set() for cell in World.INDEXED_CELLS}
+        for cell in World.INDEXED_CELLS:
+            code = ord(cell)
+            i = self.map.find(bytes([code]), CHUNK_HEADER.size)
+            while i >= 0:
+                chunk_id, offset = divmod(i - CHUNK_HEADER.size, size*size)
+                x = (chunk_id % self.chunks_w)*size + offset % size
+                y = (chunk_id // self.chunks_w)*size + offset // size
+                self.cell_index[cell].add((x, y))
+                i = self.map.find(bytes([code]), i+1)
+
+    def find_goals(self):
+        for cell in World.GOAL_CELLS:
+            self.goals.extend(cell for position in self.cell_index[cell])
+        self.goals.sort()
+
+    def __getstate__(self):
+        # copies and other processes share the file, but not the mapping or the resident chunks
+        state = self.__dict__.copy()
+        state["map"] = None
+        state["resident"] = collections.OrderedDict()
+        state["last_chunk_id"] = None
+        state["last_chunk"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+
+def read_chunk_header(filename):
+    # (start_x, start_y, facing, width, height) of a chunk file, or None if there isn't a usable one
+    try:
+        with open(filename, 'rb') as f:
+            data = f.read(CHUNK_HEADER.size)
+            f.seek(0, os.SEEK_END)
+            length = f.tell()
+    except OSError:
+        return None
+    if len(data) < CHUNK_HEADER.size:
+        return None
+    magic, version, start_x, start_y, facedir, width, height, chunk_size = CHUNK_HEADER.unpack(data)
+    chunks = -(-width // chunk_size) * -(-height // chunk_size)
+    if (magic != CHUNK_MAGIC or version != CACHE_VERSION or chunk_size != ChunkedWorld.CHUNK_SIZE
+            or length != CHUNK_HEADER.size + chunks*chunk_size*chunk_size):
+        return None
+    return start_x, start_y, facedir.decode('ascii'), width, height
+
+def write_chunk_file(filename, parsed, chunk_size):
+    # the grid rearranged chunk by chunk, each chunk row-major and padded out with walls
+    start_x, start_y, facedir, width, height, grid = parsed
+    chunks_w = -(-width // chunk_size)
+    chunks_h = -(-height // chunk_size)
+    temp_filename = f"{filename}.{os.getpid()}.tmp"
+    os.makedirs(os.path.dirname(filename) or '.', exist_ok=True)
+    with open(temp_filename, 'wb') as f:
+        f.write(CHUNK_HEADER.pack(
+            CHUNK_MAGIC, CACHE_VERSION, start_x, start_y, facedir.encode('ascii'), width, height, chunk_size
+        ))
+        for cy in range(chunks_h):
+            for cx in range(chunks_w):
+                chunk = bytearray(b'w') * (chunk_size*chunk_size)
+                row_start = cx*chunk_size
+                row_width = min(chunk_size, width - row_start)
+                for row in range(min(chunk_size, height - cy*chunk_size)):
+                    start = (cy*chunk_size + row)*width + row_start
+                    chunk[row*chunk_size:row*chunk_size + row_width] = grid[start:start + row_width]
+                f.write(chunk)
+    os.replace(temp_filename, filename)
@@ -0,0 +1,206 @@
+import sys
+import random
+import misc
+
+# Generates worlds of any size in the load_world format. The map is a maze
+# carved by a randomized depth-first search over "rooms" (the cells at odd
+# coordinates), so every carved cell is reachable from the start; the exit,
+# stairs and goals are only ever placed on carved cells, which makes every
+# generated world solvable. Extra walls can then be knocked out to add loops.
+
+FLOOR = ord('g')
+WALL = ord('w')
+
+# where the exit can go
+EXIT_PLACEMENTS = ["far", "random", "corner"]
+
+def generate_world(width, height, seed=None, density=1.0, loops=0.0, stair_pairs=0, goals=0, exit_placement="far"):
+    # returns (start_x, start_y, facing, width, height, grid) with the grid as
+    # row-major bytes of cell codes, the same as world.parse_world
+    rng = random.Random(seed)
+
+    # rooms are the cells at odd coordinates, and the walls between them get carved
+    rooms_w = (width - 1) // 2
+    rooms_h = (height - 1) // 2
+    if rooms_w < 1 or rooms_h < 1:
+        raise misc.InvalidWorldException(f"A {width}x{height} world is too small to generate.")
+    if stair_pairs > 2:
+        raise misc.InvalidWorldException("Worlds can only have two stair pairs (b/o and y/p).")
+    room_count = rooms_w * rooms_h
+
+    def cell_of(room):
+        return (2*(room // rooms_w) + 1)*width + 2*(room % rooms_w) + 1
+
+    grid = bytearray([WALL]) * (width*height)
+    carved = bytearray(room_count)
+    target = max(1, min(room_count, int(density * room_count)))
+
+    # carve the maze with an explicit stack, remembering the deepest room as the far exit
+    carved[0] = 1
+    grid[cell_of(0)] = FLOOR
+    count = 1
+    far_room = 0
+    far_depth = 0
+    stack = [0]
+    options = []
+    while stack and count < target:
+        room = stack[-1]
+        x = room % rooms_w
+        options.clear()
+        if x > 0 and not carved[room - 1]:
+            options.append(room - 1)
+        if x < rooms_w - 1 and not carved[room + 1]:
+            options.append(room + 1)
+        if room >= rooms_w and not carved[room - rooms_w]:
+            options.append(room - rooms_w)
+        if room + rooms_w < room_count and not carved[room + rooms_w]:
+            options.append(room + rooms_w)
+        if not options:
+            stack.pop()
+            continue
+
+        neighbor = options[rng.randrange(len(options))]
+        carved[neighbor] = 1
+        count += 1
+        a = cell_of(room)
+        b = cell_of(neighbor)
+        grid[(a + b) // 2] = FLOOR
+        grid[b] = FLOOR
+        stack.append(neighbor)
+        if len(stack) > far_depth:
+            far_depth = len(stack)
+            far_room = neighbor
+
+    # knock out some of the remaining walls between carved rooms, making loops
+    if loops > 0:
+        for room in range(room_count):
+            if not carved[room]:
+                continue
+            a = cell_of(room)
+            if room % rooms_w < rooms_w - 1 and carved[room + 1] and grid[a + 1] == WALL and rng.random() < loops:
+                grid[a + 1] = FLOOR
+            if room + rooms_w < room_count and carved[room + rooms_w] and grid[a + width] == WALL and rng.random() < loops:
+                grid[a + width] = FLOOR
+
+    # special cells each take a carved room of their own, never the start
+    specials = 1 + 2*stair_pairs + goals
+    if specials > count - 1:
+        raise misc.InvalidWorldException(
+            f"Only {count} rooms were carved, too few for the exit, {stair_pairs} stair pairs and {goals} goals."
+        )
+    used = {0}
+
+    def random_room():
+        # rejection sampling, which is quick as long as a fair share of rooms are carved
+        while True:
+            room = rng.randrange(room_count)
+            if carved[room] and room not in used:
+                used.add(room)
+                return room
+
+    match exit_placement:
+        case "far":
+            exit_room = far_room
+        case "corner":
+            exit_room = next(room for room in range(room_count - 1, 0, -1) if carved[room])
+        case "random":
+            exit_room = random_room()
+        case _:
+            raise misc.InvalidWorldException(f"{exit_placement} is not an exit placement ({', '.join(EXIT_PLACEMENTS)}).")
+    used.add(exit_room)
+    grid[cell_of(exit_room)] = ord('r')
+
+    for stairs in ["bo", "yp"][:stair_pairs]:
+        for stair in stairs:
+            grid[cell_of(random_room())] = ord(stair)
+
+    for i in range(goals):
+        grid[cell_of(random_room())] = ord(str((i + 1) % 10))
+
+    facing = rng.choice(['N', 'E', 'S', 'W'])
+    return 1, 1, facing, width, height, bytes(grid)
+
+def format_world(parsed):
+    # the text of a world file, as load_world reads it
+    start_x, start_y, facing, width, height, grid = parsed
+    lines = [f"{start_x} {start_y}\n{facing}\n".encode()]
+    row = bytearray(b' ') * (2*width - 1)
+    for y in range(height):
+        # put a space between every cell in one slice assignment
+        row[0::2] = grid[y*width:(y+1)*width]
+        lines.append(bytes(row) + b"\n")
+    return b"".join(lines)
+
+def write_world(filename, width, height, **options):
+    with open(filename, 'wb') as f:
+        f.write(format_world(generate_world(width, height, **options)))
+    return filename
+
+def main():
+
+    output_filename = None
+    width = 100
+    height = None
+    options = {}
+
+    args = sys.argv
+
+    if "-h" in args:
+        print("""
+Help:
+-o <FILE_PATH>   | writes the generated world to this file
+-W <WIDTH>       | width of the world in cells (defaults to 100)
+-H <HEIGHT>      | height of the world in cells (defaults to the width)
+-s <SEED>        | seeds the generator, so the same seed gives the same world
+-d <FRACTION>    | fraction of the maze's rooms to carve (defaults to 1)
+-l <FRACTION>    | chance of knocking out each remaining inner wall, adding loops (defaults to 0)
+-k <NUM_PAIRS>   | number of stair pairs, b/o then y/p (0 to 2)
+-n <NUM_GOALS>   | number of goal cells, numbered 1 to 9 then 0 and around again
+-e <PLACEMENT>   | where the exit goes: far (deepest in the maze), random or corner
+""")
+        return
+
+    i = 1
+    while i < len(args):
+        try:
+            if args[i] == "-o":
+                output_filename = args[i+1]
+            elif args[i] == "-W":
+                width = int(args[i+1])
+            elif args[i] == "-H":
+                height = int(args[i+1])
+            elif args[i] == "-s":
+                options["seed"] = int(args[i+1])
+            elif args[i] == "-d":
+                options["density"] = float(args[i+1])
+            elif args[i] == "-l":
+                options["loops"] = float(args[i+1])
+            elif args[i] == "-k":
+                options["stair_pairs"] = int(args[i+1])
+            elif args[i] == "-n":
+                options["goals"] = int(args[i+1])
+            elif args[i] == "-e":
+                options["exit_placement"] = args[i+1]
+        except IndexError:
+            print("Incorrect command line arguments. Run with -h for help.")
+            return
+        except ValueError:
+            print(f"{args[i]} expects a number: {args[i+1]}")
+            return
+
+        i+=1
+
+    if output_filename is None:
+        print("Output argument missing. Run with -h for help.")
+        return
+
+    try:
+        write_world(output_filename, width, height if height is not None else width, **options)
+        print(f"Wrote {output_filename}")
+    except misc.InvalidWorldException as e:
+        print(e)
+
+
+
+if __name__ == "__main__":
+    main()